@@ -29,6 +29,7 @@ from app.models import otp
 from app.models import chatroom
 from app.models import message
 from app.models import subscription  # import all your models so Alembic sees them
+from app.models import summary
 # from app.models import message
 
 target_metadata = Base.metadata
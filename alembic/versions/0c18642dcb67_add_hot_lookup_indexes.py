@@ -0,0 +1,49 @@
+"""add_hot_lookup_indexes
+
+Revision ID: 0c18642dcb67
+Revises: 7eb530acf554
+Create Date: 2026-10-18 10:03:17.224906
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0c18642dcb67'
+down_revision: Union[str, Sequence[str], None] = '7eb530acf554'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# messages.chatroom_id lookups are already served by ix_messages_chatroom_created_id (7eb530acf554)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Keep the newest subscription per user so the unique index can be built
+    op.execute(
+        "DELETE FROM subscriptions WHERE id NOT IN "
+        "(SELECT MAX(id) FROM subscriptions GROUP BY user_id)"
+    )
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction; other dialects ignore the flag
+    with op.get_context().autocommit_block():
+        op.create_index(op.f('ix_chatrooms_user_id'), 'chatrooms', ['user_id'], unique=False,
+                        postgresql_concurrently=True)
+        op.create_index('ix_otps_user_purpose_verified_expires', 'otps',
+                        ['user_id', 'purpose', 'is_verified', 'expires_at'], unique=False,
+                        postgresql_concurrently=True)
+        op.create_index(op.f('ix_subscriptions_user_id'), 'subscriptions', ['user_id'], unique=True,
+                        postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(op.f('ix_subscriptions_user_id'), table_name='subscriptions',
+                      postgresql_concurrently=True)
+        op.drop_index('ix_otps_user_purpose_verified_expires', table_name='otps',
+                      postgresql_concurrently=True)
+        op.drop_index(op.f('ix_chatrooms_user_id'), table_name='chatrooms',
+                      postgresql_concurrently=True)
@@ -0,0 +1,63 @@
+"""add_messages_token_count
+
+Revision ID: 44154377e6c3
+Revises: 0c18642dcb67
+Create Date: 2026-10-18 13:26:52.730419
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.integrations.token_estimator import token_estimator
+
+
+# revision identifiers, used by Alembic.
+revision: str = '44154377e6c3'
+down_revision: Union[str, Sequence[str], None] = '0c18642dcb67'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 1000
+
+messages = sa.table(
+    'messages',
+    sa.column('id', sa.Integer),
+    sa.column('content', sa.Text),
+    sa.column('token_count', sa.Integer),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('messages', sa.Column('token_count', sa.Integer(), nullable=True))
+
+    # Backfill existing rows in id order, one batch at a time
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(messages.c.id, messages.c.content)
+            .where(messages.c.id > last_id)
+            .order_by(messages.c.id)
+            .limit(BACKFILL_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        bind.execute(
+            messages.update()
+            .where(messages.c.id == sa.bindparam('row_id'))
+            .values(token_count=sa.bindparam('tokens')),
+            [{'row_id': row.id, 'tokens': token_estimator.raw_count(row.content)} for row in rows],
+        )
+        last_id = rows[-1].id
+
+    with op.batch_alter_table('messages') as batch_op:
+        batch_op.alter_column('token_count', existing_type=sa.Integer(), nullable=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('messages') as batch_op:
+        batch_op.drop_column('token_count')
@@ -0,0 +1,37 @@
+"""add_chatroom_summaries
+
+Revision ID: 7c57fd28c439
+Revises: 44154377e6c3
+Create Date: 2026-10-18 15:02:11.408213
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c57fd28c439'
+down_revision: Union[str, Sequence[str], None] = '44154377e6c3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'chatroom_summaries',
+        sa.Column('chatroom_id', sa.String(), nullable=False),
+        sa.Column('content', sa.Text(), server_default='', nullable=False),
+        sa.Column('summarized_through_id', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('token_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['chatroom_id'], ['chatrooms.id'], ),
+        sa.PrimaryKeyConstraint('chatroom_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('chatroom_summaries')
@@ -0,0 +1,28 @@
+"""add_messages_chatroom_created_index
+
+Revision ID: 7eb530acf554
+Revises: 7b568c02c660
+Create Date: 2026-10-18 09:12:41.508112
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7eb530acf554'
+down_revision: Union[str, Sequence[str], None] = '7b568c02c660'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Keyset pagination on GET /message/{chatroom_id} reads one range of this index per page
+    op.create_index('ix_messages_chatroom_created_id', 'messages', ['chatroom_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_messages_chatroom_created_id', table_name='messages')
@@ -1,5 +1,6 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db.session import get_db
 from app.schemas.auth import (
@@ -14,6 +15,7 @@ from app.services import auth_service
 from app.models.user import User
 from app.core.logger import logger
 from app.core.auth_utils import get_current_user
+from app.core.jwt import revoke_token
 
 from starlette.responses import JSONResponse
 
@@ -22,12 +24,12 @@ from starlette.responses import JSONResponse
 auth_router = APIRouter(prefix="/auth", tags=["Auth"])
 
 @auth_router.post("/signup", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def signup(data: SignupRequest, db: Session = Depends(get_db)):
+async def signup(data: SignupRequest, db: AsyncSession = Depends(get_db)):
     """
     Register a new user with mobile number and optional name.
     """
     try:
-        user = auth_service.signup_user(db, data.mobile_number, data.name)
+        user = await auth_service.signup_user(db, data.mobile_number, data.name)
         if not user:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="User signup failed")
 
@@ -51,16 +53,17 @@ def signup(data: SignupRequest, db: Session = Depends(get_db)):
 
 
 @auth_router.post("/send-otp", status_code=status.HTTP_200_OK)
-def send_otp(data: SendOTPRequest, db: Session = Depends(get_db)):
+async def send_otp(data: SendOTPRequest, db: AsyncSession = Depends(get_db)):
     """
     Send an OTP for login or password reset.
     """
     try:
-        user = db.query(User).filter(User.mobile_number == data.mobile_number).first()
+        result = await db.execute(select(User).where(User.mobile_number == data.mobile_number))
+        user = result.scalars().first()
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
 
-        otp_code = auth_service.send_otp(db, user.id, data.purpose,data.mobile_number)
+        otp_code = await auth_service.send_otp(db, user.id, data.purpose,data.mobile_number)
         if not otp_code:
             raise HTTPException(status_code=500, detail="Failed to generate OTP")
 
@@ -83,12 +86,12 @@ def send_otp(data: SendOTPRequest, db: Session = Depends(get_db)):
     
 
 @auth_router.post("/verify-otp", response_model=TokenResponse)
-def verify_otp(data: VerifyOTPRequest, db: Session = Depends(get_db)):
+async def verify_otp(data: VerifyOTPRequest, db: AsyncSession = Depends(get_db)):
     """
     Verify OTP and return JWT access token.
     """
     try:
-        access_token = auth_service.verify_otp(db, data.mobile_number, data.otp, data.purpose)
+        access_token = await auth_service.verify_otp(db, data.mobile_number, data.otp, data.purpose)
         if not access_token:
             raise HTTPException(status_code=400, detail="Invalid or expired OTP")
 
@@ -111,16 +114,16 @@ def verify_otp(data: VerifyOTPRequest, db: Session = Depends(get_db)):
 
 
 @auth_router.post("/change-password", status_code=status.HTTP_200_OK)
-def change_password(
+async def change_password(
     data: ChangePasswordRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     user: User = Depends(get_current_user)
 ):
     """
     Change the password for an authenticated user.
     """
     try:
-        updated_user = auth_service.change_password(db, user, data.new_password)
+        updated_user = await auth_service.change_password(db, user, data.new_password)
         if not updated_user:
             raise HTTPException(status_code=500, detail="Password update failed")
 
@@ -136,4 +139,27 @@ def change_password(
         return JSONResponse(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             content={"message": "Internal Server Error"}
-        )
\ No newline at end of file
+        )
+
+
+@auth_router.post("/logout", status_code=status.HTTP_200_OK)
+async def logout(
+    authorization: str = Header(..., description="Bearer access token"),
+    user: User = Depends(get_current_user)
+):
+    """
+    Revoke the access token used for this request.
+    """
+    if not await revoke_token(authorization.split(" ")[1]):
+        return JSONResponse(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            content={"message": "Internal Server Error"}
+        )
+
+    logger.info(f"User {user.id} logged out")
+    return JSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={
+            "message": "Logged out successfully"
+        }
+    )
@@ -1,11 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import status
 from starlette.responses import JSONResponse
 from typing import List
 
 
-from app.db.session import get_db
+from app.db.session import get_db, get_read_db
 from app.schemas.chatroom import ChatroomCreate, ChatroomRead
 from app.services import chatroom_service
 from app.core import caching
@@ -18,14 +18,14 @@ chat_router = APIRouter(prefix="/chat", tags=["Chat"])
 @chat_router.post("/chatroom", response_model=ChatroomRead, status_code=status.HTTP_201_CREATED)
 async def create_chatroom(
     chatroom: ChatroomCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Create a new chatroom for the current authenticated user.
     """
     try:
-        new_room = chatroom_service.create_chatroom(db, current_user.id, chatroom)
+        new_room = await chatroom_service.create_chatroom(db, current_user.id, chatroom)
         chatroom_response = ChatroomRead.model_validate(new_room)
         return JSONResponse(
             status_code=status.HTTP_201_CREATED,
@@ -40,7 +40,7 @@ async def create_chatroom(
 
 
 @chat_router.get("/chatroom", response_model=list[ChatroomRead])
-async def get_chatrooms(db: Session = Depends(get_db), current_user: User = Depends(get_current_user))-> List[ChatroomRead]:
+async def get_chatrooms(db: AsyncSession = Depends(get_read_db), current_user: User = Depends(get_current_user))-> List[ChatroomRead]:
     """
     Retrieve all chatrooms for the current authenticated user.
     """
@@ -50,7 +50,7 @@ async def get_chatrooms(db: Session = Depends(get_db), current_user: User = Depe
         if cached:
             return cached
         
-        chatrooms = chatroom_service.get_chatrooms(db, current_user.id)
+        chatrooms = await chatroom_service.get_chatrooms(db, current_user.id)
         result = [ChatroomRead.model_validate(c) for c in chatrooms]
         
         # Cache the chatrooms
@@ -69,12 +69,12 @@ async def get_chatrooms(db: Session = Depends(get_db), current_user: User = Depe
 
 
 @chat_router.get("/chatroom/{id}", response_model=ChatroomRead)
-async def get_chatroom(id: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def get_chatroom(id: str, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
     """
     Retrieve a chatroom by ID for the current authenticated user.
     """
     try:
-        chatroom = chatroom_service.get_chatroom_by_id(db, id, current_user.id)
+        chatroom = await chatroom_service.get_chatroom_by_id(db, id, current_user.id)
         if not chatroom:
             return JSONResponse(status_code=status.HTTP_204_NO_CONTENT, detail="Chatroom not found")
         
@@ -1,85 +1,231 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from starlette.responses import JSONResponse
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, WebSocket, WebSocketDisconnect, status
+import asyncio
+import math
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.responses import JSONResponse, StreamingResponse
+import json
 
 
-from app.db.session import get_db
+from app.db.session import get_db, get_read_db, AsyncSessionLocal
 from app.services.limiting import check_prompt_limit
+from app.services.admission import check_queue_admission
 from app.services.subscription_service import SubscriptionService
-from app.schemas.message import MessageCreate, MessageRead
-from app.services import message_service
-from app.workers.message_task import process_gemini_response
+from app.schemas.message import MessageCreate, MessageRead, MessagePage
+from app.services import message_service, chatroom_service, prompt_service, idempotency
+from app.core.pubsub import broadcaster
+from app.workers import scheduler
+from app.workers.message_task import run_next_gemini_job
+from app.integrations.gemini import get_gemini_client
 from app.models.user import User
+from app.models.subscription import Subscription, SubscriptionTierEnum
 from app.core.logger import logger
-from app.core.auth_utils import get_current_user
+from app.core.auth_utils import get_current_user, authenticate
 
 
 message_router = APIRouter(prefix="/message", tags=["Message"])
 
-@message_router.post("/{chatroom_id}", response_model=list[MessageRead], status_code=201)
-async def send_message(chatroom_id: str, msg: MessageCreate, db: Session = Depends(get_db),
-                       current_user: User = Depends(get_current_user)):
+async def _user_tier(db: AsyncSession, current_user: User) -> str:
+    # check the status of the user's subscription; get_status returns a response when there is none
+    subscription =await SubscriptionService.get_status(user_id=current_user.id, db=db)
+    return subscription.tier.value if isinstance(subscription, Subscription) else SubscriptionTierEnum.basic.value
+
+
+async def _store_prompt(db: AsyncSession, chatroom_id: str, content: str, current_user: User, tier: str):
     """
-    Send a message in a chatroom.
-    This will create a user message and trigger the Gemini response
+    Enforces the prompt limit and stores the user message.
+    """
+    # Enforce usage limit
+    await check_prompt_limit(current_user.id, tier)
+
+    # Create user message
+    return await message_service.create_user_message(db, chatroom_id, content)
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _send(db: AsyncSession, chatroom_id: str, content: str, current_user: User) -> dict:
+    """
+    Stores the prompt and queues the Gemini job for it; returns the response body.
     """
     try:
-        # check the status of the user's subscription
-        subscription =await SubscriptionService.get_status(user_id=current_user.id)
-        if subscription.status_code==404:
-            logger.error(f"Subscription not found for user {current_user.id}")
-            # tier = subscription.tier.value if subscription else "basic"
-
-            # Enforce usage limit
-            await check_prompt_limit(current_user.id, 'basic')
-
-        # Create user message
-        user_msg = message_service.create_user_message(db, chatroom_id, msg.content)
-
-        # Fetch chat history and chatroom context
-        chat_history_raw = message_service.get_chat_history(db, chatroom_id)
-        chat_history = [
-            {"role": msg.sender.value, "parts": [msg.content]}
-            for msg in chat_history_raw
-        ]
-
-        process_gemini_response.delay(
-            chat_history=chat_history,
-            user_message=msg.content,
-            chatroom_id=chatroom_id,
-        )
-        
-        
-        user_message={
-            "id": user_msg.id,
-            "chatroom_id": user_msg.chatroom_id,
-            "sender": user_msg.sender.value,
-            "content": user_msg.content,
-            "created_at": user_msg.created_at.isoformat()
+        tier = await _user_tier(db, current_user)
+        # Turn the prompt away before it is stored or counted when the Gemini queue is backed up
+        await check_queue_admission(tier)
+        user_msg = await _store_prompt(db, chatroom_id, content, current_user, tier)
+
+        # Queued in the tier's lane under this user; the worker loads the question and history itself
+        await scheduler.submit_job(tier, current_user.id, {"chatroom_id": chatroom_id, "message_id": user_msg.id})
+        run_next_gemini_job.delay()
+
+        return {
+            "message": "Message sent successfully",
+            "data": message_service.serialize_message(user_msg)
         }
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error sending message in chatroom {chatroom_id}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to send message")
+
+
+@message_router.post("/{chatroom_id}", response_model=list[MessageRead], status_code=201)
+async def send_message(chatroom_id: str, msg: MessageCreate, db: AsyncSession = Depends(get_db),
+                       current_user: User = Depends(get_current_user),
+                       idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
+    """
+    Send a message in a chatroom.
+    This will create a user message and trigger the Gemini response.
+    Retries carrying the same Idempotency-Key get the first response back
+    (with an Idempotent-Replayed header) instead of sending the prompt again.
+    """
+    if not idempotency_key:
+        return JSONResponse(status_code=201, content=await _send(db, chatroom_id, msg.content, current_user))
 
+    fingerprint = idempotency.request_fingerprint(chatroom_id, msg.content)
+    claimed, stored = await idempotency.claim(current_user.id, idempotency_key, fingerprint)
+    if stored is not None:
         return JSONResponse(
-            status_code=201,
-            content={
-                "message": "Message sent successfully",
-                "data": user_message
-            }
+            status_code=stored["status_code"], content=stored["content"], headers={"Idempotent-Replayed": "true"}
         )
-    
+    try:
+        content = await _send(db, chatroom_id, msg.content, current_user)
+    except BaseException:
+        await idempotency.release(current_user.id, idempotency_key, claimed)
+        raise
+    await idempotency.complete(current_user.id, idempotency_key, claimed, 201, content)
+    return JSONResponse(status_code=201, content=content)
+
+
+@message_router.post("/{chatroom_id}/stream", status_code=200)
+async def stream_message(chatroom_id: str, msg: MessageCreate, db: AsyncSession = Depends(get_db),
+                         current_user: User = Depends(get_current_user)):
+    """
+    Send a message in a chatroom and stream Gemini's reply back as Server-Sent Events.
+    Emits a `user_message` event, one `chunk` event per piece of generated text,
+    then `done` with the stored reply (or `error` if generation fails).
+    """
+    try:
+        tier = await _user_tier(db, current_user)
+        user_msg = await _store_prompt(db, chatroom_id, msg.content, current_user, tier)
+        model_prompt, chat_history = await prompt_service.build_prompt(db, chatroom_id, user_msg.id, msg.content)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error sending message in chatroom {chatroom_id}: {e}")
         raise HTTPException(status_code=500, detail="Failed to send message")
+
+    user_data = message_service.serialize_message(user_msg)
+    # Give the connection back now rather than holding it for the whole stream
+    await db.close()
+
+    async def event_stream():
+        yield _sse("user_message", user_data)
+        parts = []
+        try:
+            async for text in get_gemini_client().stream_response(chat_history, msg.content, model_prompt):
+                parts.append(text)
+                yield _sse("chunk", {"text": text})
+        except Exception as e:
+            logger.error(f"Gemini stream failed for chatroom {chatroom_id}: {e}")
+            error = {"detail": "Error getting response from Gemini. Please try again."}
+            if getattr(e, "retry_after", None):
+                error["retry_after"] = math.ceil(e.retry_after)
+            yield _sse("error", error)
+            return
+
+        # The request's session may already be closed once streaming starts, so persist with a fresh one
+        try:
+            async with AsyncSessionLocal() as stream_db:
+                reply = await message_service.create_gemini_message_async(stream_db, chatroom_id, "".join(parts))
+        except Exception as e:
+            logger.error(f"Failed to store streamed reply for chatroom {chatroom_id}: {e}")
+            yield _sse("error", {"detail": "Failed to store Gemini response"})
+            return
+        yield _sse("done", message_service.serialize_message(reply))
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
     
 
-@message_router.get("/{chatroom_id}", response_model=list[MessageRead], status_code=200)
-async def get_chatroom_messages(chatroom_id: str, db: Session = Depends(get_db),
+@message_router.get("/{chatroom_id}", response_model=MessagePage, status_code=200)
+async def get_chatroom_messages(chatroom_id: str,
+                                before: Optional[str] = Query(None, description="Cursor: return messages older than this"),
+                                after: Optional[str] = Query(None, description="Cursor: return messages newer than this"),
+                                limit: int = Query(50, ge=1, le=200),
+                                db: AsyncSession = Depends(get_read_db),
                                 current_user: User = Depends(get_current_user)):
     """
-    Retrieve all messages in a chatroom.
+    Retrieve a page of messages in a chatroom, oldest first.
+    Pass the returned next_cursor as `before` (or as `after` when paging forward) to get the next page.
     """
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use either 'before' or 'after', not both")
     try:
-        messages = message_service.get_messages(db, chatroom_id)
-        return messages
+        messages, next_cursor = await message_service.get_messages(
+            db, chatroom_id, limit=limit, before=before, after=after
+        )
+        return MessagePage(
+            messages=[MessageRead.model_validate(m) for m in messages],
+            next_cursor=next_cursor,
+        )
+    except ValueError as e:
+        logger.warning(f"Bad cursor for chatroom {chatroom_id}: {e}")
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     except Exception as e:
         logger.error(f"Error retrieving messages for chatroom {chatroom_id}: {e}")
-        raise HTTPException(status_code=500, detail="Failed to retrieve messages")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Failed to retrieve messages")
+
+
+@message_router.websocket("/{chatroom_id}/ws")
+async def chatroom_socket(websocket: WebSocket, chatroom_id: str, token: Optional[str] = None):
+    """
+    Push every new message in a chatroom to the client as soon as it is stored.
+    When Gemini fails to answer a prompt for good, a payload with an ``error``
+    field and the prompt's ``message_id`` is pushed instead of a reply.
+    Authenticate with the usual Bearer token, either in the Authorization
+    header or, for browsers, as the `token` query parameter.
+    """
+    authorization = websocket.headers.get("authorization") or f"Bearer {token or ''}"
+    try:
+        async with AsyncSessionLocal() as db:
+            user = await authenticate(authorization, db)
+            chatroom = await chatroom_service.get_chatroom_by_id(db, chatroom_id, user.id)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    if not chatroom:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    queue = await broadcaster.subscribe(chatroom_id)
+    logger.info(f"WebSocket opened for chatroom {chatroom_id} by user {user.id}")
+
+    async def forward():
+        while True:
+            await websocket.send_json(await queue.get())
+
+    async def drain():
+        # Client frames are ignored; this only notices the disconnect
+        while True:
+            await websocket.receive_text()
+
+    tasks = [asyncio.create_task(forward()), asyncio.create_task(drain())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            error = task.exception()
+            if error and not isinstance(error, WebSocketDisconnect):
+                logger.error(f"WebSocket error in chatroom {chatroom_id}: {error}")
+    finally:
+        for task in tasks:
+            task.cancel()
+        await broadcaster.unsubscribe(chatroom_id, queue)
+        logger.info(f"WebSocket closed for chatroom {chatroom_id}")
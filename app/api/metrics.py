@@ -0,0 +1,60 @@
+from fastapi import APIRouter, status
+from starlette.responses import JSONResponse
+
+from app.core.caching import get_response_cache_stats
+from app.services.admission import queue_status
+from app.integrations.gemini import gemini_breaker
+from app.db.base import get_pool_stats
+from app.db.session import read_router
+from app.core.logger import logger
+
+metrics_router = APIRouter(prefix="/metrics", tags=["Metrics"])
+
+
+@metrics_router.get("/db-pool", status_code=status.HTTP_200_OK)
+async def db_pool_metrics():
+    """
+    Connection pool usage for this worker process: checked-out connections,
+    overflow in use and time spent waiting for a free connection, plus the
+    health of each read replica.
+    """
+    return JSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={"pools": get_pool_stats(), "replicas": read_router.status()}
+    )
+
+
+@metrics_router.get("/response-cache", status_code=status.HTTP_200_OK)
+async def response_cache_metrics():
+    """
+    Hits and misses of the Gemini response cache across all workers, and how
+    many replies it currently holds.
+    """
+    try:
+        stats = await get_response_cache_stats()
+    except Exception as e:
+        logger.error(f"Error reading response cache stats: {e}")
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"message": "Response cache stats unavailable"}
+        )
+    return JSONResponse(status_code=status.HTTP_200_OK, content=stats)
+
+
+@metrics_router.get("/gemini-queue", status_code=status.HTTP_200_OK)
+async def gemini_queue_metrics():
+    """
+    Jobs waiting in each tier's lane against its admission thresholds, the
+    queue wait, run time and completion rate of recent Gemini jobs, and the
+    state of the Gemini circuit breaker.
+    """
+    try:
+        content = await queue_status()
+        content["circuit_breaker"] = await gemini_breaker.state()
+    except Exception as e:
+        logger.error(f"Error reading Gemini queue status: {e}")
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"message": "Gemini queue status unavailable"}
+        )
+    return JSONResponse(status_code=status.HTTP_200_OK, content=content)
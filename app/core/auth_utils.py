@@ -1,14 +1,21 @@
 from fastapi import Depends, HTTPException, Header, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.jwt import verify_token
+from app.core import caching
+from app.core.jwt import is_token_revoked, verify_token
 from app.db.session import get_db
 from app.models.user import User
 from app.core.logger import logger  
 
-def get_current_user(
+def principal_fields(user: User) -> dict:
+    """The user fields request handlers rely on; what the user cache stores."""
+    return {"id": user.id, "mobile_number": user.mobile_number, "name": user.name, "is_active": user.is_active}
+
+
+async def get_current_user(
     authorization: str = Header(..., description="Bearer access token"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> User:
     """
     Dependency to extract and return the currently authenticated user
@@ -18,7 +25,19 @@ def get_current_user(
         HTTPException: If token is invalid or user is not found.
 
     Returns:
-        User: The authenticated user from the database.
+        User: The authenticated user. Usually built from the user cache, so it
+        is not attached to ``db``; load the row before changing it.
+    """
+    return await authenticate(authorization, db)
+
+
+async def authenticate(authorization: str, db: AsyncSession) -> User:
+    """
+    Resolves a "Bearer <token>" value to its user. Shared by get_current_user
+    and the WebSocket endpoints, which cannot use Header dependencies.
+
+    Raises:
+        HTTPException: If token is invalid or user is not found.
     """
     try:
         if not authorization.startswith("Bearer "):
@@ -30,21 +49,28 @@ def get_current_user(
 
         token = authorization.split(" ")[1]
         payload = verify_token(token)
-        if not payload:
+        if not payload or await is_token_revoked(token):
             logger.warning("JWT token verification failed")
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid or expired token"
             )
 
-        user = db.query(User).filter(User.id == payload.get("user_id")).first()
+        user_id = payload.get("user_id")
+        cached = await caching.get_cached_user(user_id)
+        if cached is not None:
+            return User(**cached)
+
+        result = await db.execute(select(User).where(User.id == user_id))
+        user = result.scalars().first()
         if not user:
-            logger.warning(f"User not found with ID {payload.get('user_id')}")
+            logger.warning(f"User not found with ID {user_id}")
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="User not found"
             )
 
+        await caching.set_cached_user(principal_fields(user))
         return user
 
     except HTTPException:
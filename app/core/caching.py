@@ -1,8 +1,11 @@
+from cachetools import TTLCache
 from fastapi import HTTPException
+from redis import Redis
 from redis import asyncio as aioredis
 from typing import Optional, List
 import json
 import os
+import time
 
 from app.core.logger import logger
 from app.config import Config
@@ -11,6 +14,8 @@ from app.config import Config
 # Create Redis connection
 try:
     redis = aioredis.from_url(Config.REDIS_URL, decode_responses=True)
+    # Sync client for Celery workers, which run outside an event loop
+    sync_redis = Redis.from_url(Config.REDIS_URL, decode_responses=True)
 except Exception as e:
     logger.error("Failed to connect to Redis", exc_info=True)
     raise HTTPException(
@@ -52,5 +57,344 @@ async def set_cached_chatrooms(user_id: int, chatrooms: list, ttl: int = 600)->
         raise HTTPException(
             status_code=500,
             detail="Failed to set cached chatrooms"
-        )   
-         
\ No newline at end of file
+        )
+
+
+# Recent chatroom history: a Redis list per chatroom holding the newest
+# HISTORY_CACHE_SIZE messages, oldest first. Appends use RPUSHX so a list is
+# only extended once it has been fully built from the database.
+#
+# Every append also bumps a per-chatroom version. A rebuild reads the version
+# before querying the database and is dropped if it changed meanwhile: the
+# message appended during the query may be missing from what was read, and
+# RPUSHX could not add it to a list that did not exist yet.
+HISTORY_REBUILD_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[3] then
+    return 0
+end
+redis.call('RPUSH', KEYS[1], unpack(ARGV, 4))
+redis.call('LTRIM', KEYS[1], -tonumber(ARGV[1]), -1)
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+
+def history_key(chatroom_id: str) -> str:
+    return f"chat_history:{chatroom_id}"
+
+
+def history_version_key(chatroom_id: str) -> str:
+    return f"chat_history_version:{chatroom_id}"
+
+
+def history_entry(message) -> str:
+    """Serialize a Message row for the history list."""
+    return json.dumps({
+        "id": message.id,
+        "sender": message.sender.value,
+        "content": message.content,
+        "token_count": message.token_count,
+    })
+
+
+async def get_cached_history(chatroom_id: str) -> Optional[List[dict]]:
+    """Retrieve the cached recent history of a chatroom, oldest first"""
+    try:
+        entries = await redis.lrange(history_key(chatroom_id), 0, -1)
+        if not entries:
+            logger.info(f"History cache miss for chatroom {chatroom_id}")
+            return None
+        return [json.loads(entry) for entry in entries]
+    except Exception as e:
+        logger.error(f"Error retrieving cached history for chatroom {chatroom_id}: {e}")
+        return None
+
+
+async def get_history_version(chatroom_id: str) -> Optional[str]:
+    """Current history version of a chatroom; read it before querying the database for a rebuild"""
+    try:
+        return (await redis.get(history_version_key(chatroom_id))) or "0"
+    except Exception as e:
+        logger.error(f"Error retrieving history version for chatroom {chatroom_id}: {e}")
+        return None
+
+
+async def rebuild_cached_history(chatroom_id: str, messages: list, version: Optional[str]) -> None:
+    """
+    Fill the history cache from the database; a list that already exists, or
+    a chatroom appended to since ``version`` was read, is left alone
+    """
+    if not messages or version is None:
+        return
+    try:
+        await redis.eval(
+            HISTORY_REBUILD_SCRIPT, 2, history_key(chatroom_id), history_version_key(chatroom_id),
+            Config.HISTORY_CACHE_SIZE, Config.HISTORY_CACHE_TTL, version,
+            *[history_entry(message) for message in messages],
+        )
+    except Exception as e:
+        logger.error(f"Error rebuilding cached history for chatroom {chatroom_id}: {e}")
+
+
+def get_cached_history_sync(chatroom_id: str) -> Optional[List[dict]]:
+    """Same as get_cached_history, for Celery workers"""
+    try:
+        entries = sync_redis.lrange(history_key(chatroom_id), 0, -1)
+        if not entries:
+            logger.info(f"History cache miss for chatroom {chatroom_id}")
+            return None
+        return [json.loads(entry) for entry in entries]
+    except Exception as e:
+        logger.error(f"Error retrieving cached history for chatroom {chatroom_id}: {e}")
+        return None
+
+
+def get_history_version_sync(chatroom_id: str) -> Optional[str]:
+    """Same as get_history_version, for Celery workers"""
+    try:
+        return sync_redis.get(history_version_key(chatroom_id)) or "0"
+    except Exception as e:
+        logger.error(f"Error retrieving history version for chatroom {chatroom_id}: {e}")
+        return None
+
+
+def rebuild_cached_history_sync(chatroom_id: str, messages: list, version: Optional[str]) -> None:
+    """Same as rebuild_cached_history, for Celery workers"""
+    if not messages or version is None:
+        return
+    try:
+        sync_redis.eval(
+            HISTORY_REBUILD_SCRIPT, 2, history_key(chatroom_id), history_version_key(chatroom_id),
+            Config.HISTORY_CACHE_SIZE, Config.HISTORY_CACHE_TTL, version,
+            *[history_entry(message) for message in messages],
+        )
+    except Exception as e:
+        logger.error(f"Error rebuilding cached history for chatroom {chatroom_id}: {e}")
+
+
+async def append_cached_history(message) -> None:
+    """Append a new message to its chatroom's history cache and trim it"""
+    key = history_key(message.chatroom_id)
+    try:
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.rpushx(key, history_entry(message))
+            pipe.ltrim(key, -Config.HISTORY_CACHE_SIZE, -1)
+            pipe.expire(key, Config.HISTORY_CACHE_TTL, xx=True)
+            pipe.incr(history_version_key(message.chatroom_id))
+            pipe.expire(history_version_key(message.chatroom_id), Config.HISTORY_CACHE_TTL)
+            await pipe.execute()
+    except Exception as e:
+        logger.error(f"Error appending cached history for chatroom {message.chatroom_id}: {e}")
+
+
+def append_cached_history_sync(message) -> None:
+    """Same as append_cached_history, for Celery workers"""
+    key = history_key(message.chatroom_id)
+    try:
+        with sync_redis.pipeline(transaction=True) as pipe:
+            pipe.rpushx(key, history_entry(message))
+            pipe.ltrim(key, -Config.HISTORY_CACHE_SIZE, -1)
+            pipe.expire(key, Config.HISTORY_CACHE_TTL, xx=True)
+            pipe.incr(history_version_key(message.chatroom_id))
+            pipe.expire(history_version_key(message.chatroom_id), Config.HISTORY_CACHE_TTL)
+            pipe.execute()
+    except Exception as e:
+        logger.error(f"Error appending cached history for chatroom {message.chatroom_id}: {e}")
+
+
+# Rolling chat summary, cached as {"content", "through_id"}; an empty content is
+# cached too so chatrooms without a summary do not hit the database every prompt.
+def summary_key(chatroom_id: str) -> str:
+    return f"chat_summary:{chatroom_id}"
+
+
+async def get_cached_summary(chatroom_id: str) -> Optional[dict]:
+    """Retrieve the cached summary of a chatroom"""
+    try:
+        data = await redis.get(summary_key(chatroom_id))
+        return json.loads(data) if data else None
+    except Exception as e:
+        logger.error(f"Error retrieving cached summary for chatroom {chatroom_id}: {e}")
+        return None
+
+
+async def set_cached_summary(chatroom_id: str, summary: dict) -> None:
+    try:
+        await redis.set(summary_key(chatroom_id), json.dumps(summary), ex=Config.HISTORY_CACHE_TTL)
+    except Exception as e:
+        logger.error(f"Error caching summary for chatroom {chatroom_id}: {e}")
+
+
+def set_cached_summary_sync(chatroom_id: str, summary: dict) -> None:
+    """Same as set_cached_summary, for Celery workers"""
+    try:
+        sync_redis.set(summary_key(chatroom_id), json.dumps(summary), ex=Config.HISTORY_CACHE_TTL)
+    except Exception as e:
+        logger.error(f"Error caching summary for chatroom {chatroom_id}: {e}")
+
+
+def get_cached_summary_sync(chatroom_id: str) -> Optional[dict]:
+    """Same as get_cached_summary, for Celery workers"""
+    try:
+        data = sync_redis.get(summary_key(chatroom_id))
+        return json.loads(data) if data else None
+    except Exception as e:
+        logger.error(f"Error retrieving cached summary for chatroom {chatroom_id}: {e}")
+        return None
+
+
+async def claim_summary_run(chatroom_id: str) -> bool:
+    """True at most once per SUMMARY_DEBOUNCE_SECONDS per chatroom, so busy rooms queue one summary task"""
+    try:
+        return bool(await redis.set(
+            f"summary_pending:{chatroom_id}", 1, nx=True, ex=Config.SUMMARY_DEBOUNCE_SECONDS
+        ))
+    except Exception as e:
+        logger.error(f"Error claiming summary run for chatroom {chatroom_id}: {e}")
+        return False
+
+
+def claim_summary_run_sync(chatroom_id: str) -> bool:
+    """Same as claim_summary_run, for Celery workers"""
+    try:
+        return bool(sync_redis.set(
+            f"summary_pending:{chatroom_id}", 1, nx=True, ex=Config.SUMMARY_DEBOUNCE_SECONDS
+        ))
+    except Exception as e:
+        logger.error(f"Error claiming summary run for chatroom {chatroom_id}: {e}")
+        return False
+
+
+# Exact-match Gemini response cache. Each entry is a string key with a TTL; a
+# sorted set indexes the entries by last use so the least recently used ones
+# are evicted once there are more than RESPONSE_CACHE_MAX_ENTRIES. Hit and miss
+# counts are kept in a hash shared by all workers.
+RESPONSE_CACHE_INDEX = "response_cache:index"
+RESPONSE_CACHE_STATS = "response_cache:stats"
+
+RESPONSE_CACHE_SET_SCRIPT = """
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+redis.call('ZADD', KEYS[2], ARGV[3], KEYS[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', ARGV[3] - ARGV[2])
+local excess = redis.call('ZCARD', KEYS[2]) - tonumber(ARGV[4])
+if excess > 0 then
+    local evicted = redis.call('ZRANGE', KEYS[2], 0, excess - 1)
+    redis.call('ZREMRANGEBYRANK', KEYS[2], 0, excess - 1)
+    redis.call('DEL', unpack(evicted))
+end
+return excess
+"""
+
+
+def response_cache_key(digest: str) -> str:
+    return f"response_cache:{digest}"
+
+
+def _set_response_args(digest: str, response: str) -> list:
+    return [
+        RESPONSE_CACHE_SET_SCRIPT, 2, response_cache_key(digest), RESPONSE_CACHE_INDEX,
+        response, Config.RESPONSE_CACHE_TTL, time.time(), Config.RESPONSE_CACHE_MAX_ENTRIES,
+    ]
+
+
+def get_cached_response_sync(digest: str) -> Optional[str]:
+    """Cached Gemini reply for a prompt digest, counting the hit or miss"""
+    key = response_cache_key(digest)
+    try:
+        with sync_redis.pipeline(transaction=False) as pipe:
+            pipe.get(key)
+            pipe.zadd(RESPONSE_CACHE_INDEX, {key: time.time()}, xx=True)
+            response, _ = pipe.execute()
+        sync_redis.hincrby(RESPONSE_CACHE_STATS, "hits" if response is not None else "misses", 1)
+        return response
+    except Exception as e:
+        logger.error(f"Error reading response cache: {e}")
+        return None
+
+
+def set_cached_response_sync(digest: str, response: str) -> None:
+    try:
+        sync_redis.eval(*_set_response_args(digest, response))
+    except Exception as e:
+        logger.error(f"Error writing response cache: {e}")
+
+
+async def get_cached_response(digest: str) -> Optional[str]:
+    """Same as get_cached_response_sync, for the event loop"""
+    key = response_cache_key(digest)
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.get(key)
+            pipe.zadd(RESPONSE_CACHE_INDEX, {key: time.time()}, xx=True)
+            response, _ = await pipe.execute()
+        await redis.hincrby(RESPONSE_CACHE_STATS, "hits" if response is not None else "misses", 1)
+        return response
+    except Exception as e:
+        logger.error(f"Error reading response cache: {e}")
+        return None
+
+
+async def set_cached_response(digest: str, response: str) -> None:
+    try:
+        await redis.eval(*_set_response_args(digest, response))
+    except Exception as e:
+        logger.error(f"Error writing response cache: {e}")
+
+
+async def get_response_cache_stats() -> dict:
+    stats = await redis.hgetall(RESPONSE_CACHE_STATS)
+    hits, misses = int(stats.get("hits", 0)), int(stats.get("misses", 0))
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": hits / (hits + misses) if hits + misses else 0.0,
+        "entries": await redis.zcard(RESPONSE_CACHE_INDEX),
+        "max_entries": Config.RESPONSE_CACHE_MAX_ENTRIES,
+    }
+
+
+# Authenticated user cache: a per-process TTL LRU in front of Redis.
+# Holds the principal fields only, never the password hash. A change made in
+# one process clears its own copy and Redis; other processes may serve their
+# copy for up to USER_CACHE_LOCAL_TTL seconds.
+_local_users = TTLCache(maxsize=Config.USER_CACHE_LOCAL_SIZE, ttl=Config.USER_CACHE_LOCAL_TTL)
+
+
+def user_key(user_id: str) -> str:
+    return f"user:{user_id}"
+
+
+async def get_cached_user(user_id: str) -> Optional[dict]:
+    user = _local_users.get(user_id)
+    if user is not None:
+        return user
+    try:
+        data = await redis.get(user_key(user_id))
+    except Exception as e:
+        logger.error(f"Error reading cached user {user_id}: {e}")
+        return None
+    if data is None:
+        return None
+    user = json.loads(data)
+    _local_users[user_id] = user
+    return user
+
+
+async def set_cached_user(user: dict) -> None:
+    _local_users[user["id"]] = user
+    try:
+        await redis.set(user_key(user["id"]), json.dumps(user), ex=Config.USER_CACHE_TTL)
+    except Exception as e:
+        logger.error(f"Error caching user {user['id']}: {e}")
+
+
+async def invalidate_cached_user(user_id: str) -> None:
+    """Call after any change to a user's row."""
+    _local_users.pop(user_id, None)
+    try:
+        await redis.delete(user_key(user_id))
+    except Exception as e:
+        logger.error(f"Error invalidating cached user {user_id}: {e}")
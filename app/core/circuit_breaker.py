@@ -0,0 +1,132 @@
+# Circuit breaker shared by every worker through Redis.
+#
+# closed:    calls go through; upstream failures are counted over a sliding
+#            window and FAILURE_THRESHOLD of them trip the breaker.
+# open:      calls fail fast for OPEN_SECONDS (the "open" key's TTL).
+# half-open: once "open" has expired but "tripped" is still set, a single
+#            caller holding the "probe" lock may call upstream. Success closes
+#            the breaker; failure opens it again. Everyone else keeps failing
+#            fast until the probe has answered.
+
+import uuid
+
+from app.config import Config
+from app.core import caching
+from app.core.logger import logger
+
+# KEYS: failures, open, tripped, probe. ARGV: window, threshold, open seconds. Returns 1 if now open.
+FAILURE_SCRIPT = """
+if redis.call('EXISTS', KEYS[3]) == 1 then
+    redis.call('SET', KEYS[2], 1, 'EX', ARGV[3])
+    redis.call('DEL', KEYS[4])
+    return 1
+end
+local failures = redis.call('INCR', KEYS[1])
+if failures == 1 then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+if failures >= tonumber(ARGV[2]) then
+    redis.call('SET', KEYS[2], 1, 'EX', ARGV[3])
+    redis.call('SET', KEYS[3], 1)
+    redis.call('DEL', KEYS[1])
+    return 1
+end
+return 0
+"""
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit {name} is open")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(self, name: str):
+        self.name = name
+        self.failures_key = f"circuit:{name}:failures"
+        self.open_key = f"circuit:{name}:open"
+        self.tripped_key = f"circuit:{name}:tripped"
+        self.probe_key = f"circuit:{name}:probe"
+
+    def _failure_args(self) -> list:
+        return [
+            FAILURE_SCRIPT, 4, self.failures_key, self.open_key, self.tripped_key, self.probe_key,
+            Config.GEMINI_BREAKER_WINDOW_SECONDS, Config.GEMINI_BREAKER_FAILURE_THRESHOLD,
+            Config.GEMINI_BREAKER_OPEN_SECONDS,
+        ]
+
+    def before_call(self) -> None:
+        """Raises CircuitOpenError unless the caller may call upstream now."""
+        try:
+            with caching.sync_redis.pipeline(transaction=False) as pipe:
+                pipe.ttl(self.open_key)
+                pipe.exists(self.tripped_key)
+                open_ttl, tripped = pipe.execute()
+            if open_ttl and open_ttl > 0:
+                raise CircuitOpenError(self.name, open_ttl)
+            if tripped and not caching.sync_redis.set(
+                self.probe_key, uuid.uuid4().hex, nx=True, ex=Config.GEMINI_BREAKER_PROBE_TIMEOUT
+            ):
+                raise CircuitOpenError(self.name, Config.GEMINI_BREAKER_OPEN_SECONDS)
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            # Without Redis there is no shared state; let the call through
+            logger.error(f"Circuit breaker {self.name} unavailable: {e}")
+
+    def record_success(self) -> None:
+        try:
+            if caching.sync_redis.exists(self.tripped_key):
+                caching.sync_redis.delete(self.tripped_key, self.probe_key, self.failures_key)
+                logger.info(f"Circuit {self.name} closed after a successful probe")
+        except Exception as e:
+            logger.error(f"Circuit breaker {self.name} unavailable: {e}")
+
+    def record_failure(self) -> None:
+        try:
+            if caching.sync_redis.eval(*self._failure_args()):
+                logger.warning(f"Circuit {self.name} open for {Config.GEMINI_BREAKER_OPEN_SECONDS}s")
+        except Exception as e:
+            logger.error(f"Circuit breaker {self.name} unavailable: {e}")
+
+    async def before_call_async(self) -> None:
+        """Same as before_call, for the event loop."""
+        try:
+            async with caching.redis.pipeline(transaction=False) as pipe:
+                pipe.ttl(self.open_key)
+                pipe.exists(self.tripped_key)
+                open_ttl, tripped = await pipe.execute()
+            if open_ttl and open_ttl > 0:
+                raise CircuitOpenError(self.name, open_ttl)
+            if tripped and not await caching.redis.set(
+                self.probe_key, uuid.uuid4().hex, nx=True, ex=Config.GEMINI_BREAKER_PROBE_TIMEOUT
+            ):
+                raise CircuitOpenError(self.name, Config.GEMINI_BREAKER_OPEN_SECONDS)
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logger.error(f"Circuit breaker {self.name} unavailable: {e}")
+
+    async def record_success_async(self) -> None:
+        try:
+            if await caching.redis.exists(self.tripped_key):
+                await caching.redis.delete(self.tripped_key, self.probe_key, self.failures_key)
+                logger.info(f"Circuit {self.name} closed after a successful probe")
+        except Exception as e:
+            logger.error(f"Circuit breaker {self.name} unavailable: {e}")
+
+    async def record_failure_async(self) -> None:
+        try:
+            if await caching.redis.eval(*self._failure_args()):
+                logger.warning(f"Circuit {self.name} open for {Config.GEMINI_BREAKER_OPEN_SECONDS}s")
+        except Exception as e:
+            logger.error(f"Circuit breaker {self.name} unavailable: {e}")
+
+    async def state(self) -> dict:
+        open_ttl = await caching.redis.ttl(self.open_key)
+        if open_ttl and open_ttl > 0:
+            return {"state": "open", "retry_after": open_ttl}
+        if await caching.redis.exists(self.tripped_key):
+            return {"state": "half_open", "probe_in_flight": bool(await caching.redis.exists(self.probe_key))}
+        return {"state": "closed", "recent_failures": int(await caching.redis.get(self.failures_key) or 0)}
@@ -1,13 +1,36 @@
 import datetime
+import hashlib
+import time
 
+from cachetools import TLRUCache
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 from jose import jwt, JWTError
 
+from app.core import caching
 from app.core.logger import logger
 from app.config import Config
 
 
+def _until_exp(digest: str, claims: Dict[str, Any], now: float) -> float:
+    return claims.get("exp", now)
+
+
+# Claims of tokens whose signature was already checked, keyed by token digest
+# and dropped at the token's exp, so a client reusing its token skips the check
+_verified_tokens = TLRUCache(maxsize=Config.JWT_CACHE_SIZE, ttu=_until_exp, timer=time.time)
+
+
+def _token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+# Revoked tokens are shared by every process through Redis, each kept until
+# the token would have expired anyway
+def revoked_token_key(digest: str) -> str:
+    return f"revoked_token:{digest}"
+
+
 def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> Optional[str]:
     """
     Creates a JWT access token.
@@ -31,7 +54,9 @@ def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta]
     
 def verify_token(token: str) -> Optional[Dict[str, Any]]:
     """
-    Verifies and decodes a JWT token.
+    Verifies and decodes a JWT token. Tokens verified before are answered
+    from an in-process cache until their exp. Revocation is not checked
+    here; callers check it with is_token_revoked.
 
     Args:
         token (str): JWT token string.
@@ -40,11 +65,54 @@ def verify_token(token: str) -> Optional[Dict[str, Any]]:
         Optional[Dict[str, Any]]: Decoded payload if valid, else None.
     """
     try:
+        digest = _token_digest(token)
+        if Config.JWT_CACHE_ENABLED:
+            payload = _verified_tokens.get(digest)
+            if payload is not None:
+                return dict(payload)
+
         payload = jwt.decode(token, Config.SECRET_KEY, algorithms=Config.ALGORITHM)
+        if Config.JWT_CACHE_ENABLED and "exp" in payload:
+            _verified_tokens[digest] = dict(payload)
         return payload
     except JWTError as e:
         logger.warning(f"JWT verification failed: {e}")
         return None
     except Exception as e:
         logger.error(f"Unexpected error during JWT verification: {e}")
-        return None
\ No newline at end of file
+        return None
+
+
+async def revoke_token(token: str) -> bool:
+    """
+    Rejects ``token`` in every process from now until its exp, e.g. on logout.
+    Only tokens that still verify need to be remembered. Returns False if
+    the revocation could not be stored.
+    """
+    digest = _token_digest(token)
+    _verified_tokens.pop(digest, None)
+    try:
+        claims = jwt.decode(token, Config.SECRET_KEY, algorithms=Config.ALGORITHM)
+    except JWTError:
+        return True
+    ttl = int(claims.get("exp", time.time()) - time.time()) + 1
+    try:
+        await caching.redis.set(revoked_token_key(digest), 1, ex=max(ttl, 1))
+        return True
+    except Exception as e:
+        logger.error(f"Error storing JWT revocation: {e}")
+        return False
+
+
+async def is_token_revoked(token: str) -> bool:
+    """Whether ``token`` was revoked with revoke_token; False if Redis is unavailable."""
+    try:
+        return bool(await caching.redis.exists(revoked_token_key(_token_digest(token))))
+    except Exception as e:
+        logger.error(f"Error checking JWT revocation: {e}")
+        return False
+
+
+def clear_token_cache() -> None:
+    """Forgets every verified token, e.g. after rotating SECRET_KEY."""
+    _verified_tokens.clear()
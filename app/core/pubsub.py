@@ -0,0 +1,102 @@
+import asyncio
+import json
+from typing import Dict, Set
+
+from app.core.caching import redis, sync_redis
+from app.core.logger import logger
+
+# Per-subscriber buffer; a socket that falls this far behind starts losing messages
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+def chatroom_channel(chatroom_id: str) -> str:
+    return f"chatroom:{chatroom_id}:messages"
+
+
+async def publish_message(chatroom_id: str, payload: dict) -> None:
+    """Publish a committed message to every API node listening on its chatroom"""
+    try:
+        await redis.publish(chatroom_channel(chatroom_id), json.dumps(payload))
+    except Exception as e:
+        logger.error(f"Error publishing message for chatroom {chatroom_id}: {e}")
+
+
+def publish_message_sync(chatroom_id: str, payload: dict) -> None:
+    """Same as publish_message, for Celery workers"""
+    try:
+        sync_redis.publish(chatroom_channel(chatroom_id), json.dumps(payload))
+    except Exception as e:
+        logger.error(f"Error publishing message for chatroom {chatroom_id}: {e}")
+
+
+class ChatroomBroadcaster:
+    """
+    Fans Redis pub/sub messages out to the WebSockets held by this process.
+
+    One Redis connection per process subscribes to a chatroom's channel while
+    at least one local socket is open on it. Every process does the same, so
+    a message published by any worker reaches sockets on every uvicorn worker
+    and host.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._pubsub = None
+        self._listener = None
+        self._lock = asyncio.Lock()
+
+    async def subscribe(self, chatroom_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        async with self._lock:
+            if self._pubsub is None:
+                self._pubsub = redis.pubsub(ignore_subscribe_messages=True)
+            subscribers = self._subscribers.setdefault(chatroom_id, set())
+            if not subscribers:
+                await self._pubsub.subscribe(chatroom_channel(chatroom_id))
+            subscribers.add(queue)
+            if self._listener is None or self._listener.done():
+                self._listener = asyncio.create_task(self._listen())
+        return queue
+
+    async def unsubscribe(self, chatroom_id: str, queue: asyncio.Queue) -> None:
+        async with self._lock:
+            subscribers = self._subscribers.get(chatroom_id)
+            if not subscribers:
+                return
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[chatroom_id]
+                await self._pubsub.unsubscribe(chatroom_channel(chatroom_id))
+
+    async def _listen(self) -> None:
+        while self._subscribers:
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Chatroom pub/sub listener error: {e}")
+                await asyncio.sleep(1)
+                continue
+            if not message or message.get("type") != "message":
+                continue
+
+            chatroom_id = message["channel"].split(":")[1]
+            payload = json.loads(message["data"])
+            for queue in list(self._subscribers.get(chatroom_id, ())):
+                try:
+                    queue.put_nowait(payload)
+                except asyncio.QueueFull:
+                    logger.warning(f"Dropping message for a slow socket in chatroom {chatroom_id}")
+
+    async def close(self) -> None:
+        if self._listener:
+            self._listener.cancel()
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+        self._subscribers.clear()
+        self._pubsub = None
+        self._listener = None
+
+
+broadcaster = ChatroomBroadcaster()
@@ -0,0 +1,148 @@
+# Single-flight: concurrent callers with the same key share one execution.
+#
+# The first caller takes a Redis lock (SET NX with a lease) and runs the
+# function; its result is stored for a short while under a result key and the
+# lock is released. Other callers poll for that result. If the leader fails,
+# it releases the lock without a result and the next poller takes over; if it
+# dies, its lease runs out and the same happens. A caller that has waited
+# SINGLE_FLIGHT_WAIT_SECONDS stops waiting and runs the function itself, so
+# nobody hangs on a stuck leader.
+
+import asyncio
+import time
+import uuid
+from typing import Awaitable, Callable, Optional, Tuple
+
+from app.config import Config
+from app.core import caching
+from app.core.logger import logger
+
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+MAX_POLL_SECONDS = 0.5
+
+
+class SingleFlight:
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+
+    def _keys(self, key: str):
+        return f"{self.prefix}:lock:{key}", f"{self.prefix}:result:{key}"
+
+    def _poll_delays(self):
+        delay = Config.SINGLE_FLIGHT_POLL_SECONDS
+        while True:
+            yield delay
+            delay = min(delay * 2, MAX_POLL_SECONDS)
+
+    def _release(self, lock_key: str, token: str):
+        try:
+            caching.sync_redis.eval(RELEASE_SCRIPT, 1, lock_key, token)
+        except Exception as e:
+            logger.error(f"Single-flight failed to release {lock_key}: {e}")
+
+    def _wait(self, key: str, token: str) -> Tuple[bool, Optional[str]]:
+        """
+        Waits until this caller leads the call or a result is ready.
+        Returns (leading, result); (False, None) means the wait timed out.
+        """
+        lock_key, result_key = self._keys(key)
+        deadline = time.monotonic() + Config.SINGLE_FLIGHT_WAIT_SECONDS
+        for delay in self._poll_delays():
+            if caching.sync_redis.set(lock_key, token, nx=True, ex=Config.SINGLE_FLIGHT_LEASE_SECONDS):
+                # The previous leader may have stored its result just before releasing
+                result = caching.sync_redis.get(result_key)
+                if result is not None:
+                    self._release(lock_key, token)
+                return result is None, result
+            result = caching.sync_redis.get(result_key)
+            if result is not None:
+                return False, result
+            if time.monotonic() >= deadline:
+                return False, None
+            time.sleep(delay)
+
+    def run(self, key: str, fn: Callable[[], str]) -> str:
+        """
+        Returns fn(), or the result of an identical call already in flight.
+        Exceptions from fn() reach the caller; waiters then take over.
+        """
+        lock_key, result_key = self._keys(key)
+        token = uuid.uuid4().hex
+        try:
+            leading, result = self._wait(key, token)
+        except Exception as e:
+            # Redis trouble must not stop the call itself
+            logger.error(f"Single-flight unavailable for {key}: {e}")
+            return fn()
+
+        if result is not None:
+            logger.info(f"Single-flight reused the in-flight result for {key}")
+            return result
+        if not leading:
+            logger.warning(f"Single-flight wait timed out for {key}; calling directly")
+            return fn()
+
+        try:
+            result = fn()
+            try:
+                caching.sync_redis.set(result_key, result, ex=Config.SINGLE_FLIGHT_RESULT_TTL)
+            except Exception as e:
+                logger.error(f"Single-flight failed to share the result for {key}: {e}")
+            return result
+        finally:
+            self._release(lock_key, token)
+
+    async def _release_async(self, lock_key: str, token: str):
+        try:
+            await caching.redis.eval(RELEASE_SCRIPT, 1, lock_key, token)
+        except Exception as e:
+            logger.error(f"Single-flight failed to release {lock_key}: {e}")
+
+    async def _wait_async(self, key: str, token: str) -> Tuple[bool, Optional[str]]:
+        lock_key, result_key = self._keys(key)
+        deadline = time.monotonic() + Config.SINGLE_FLIGHT_WAIT_SECONDS
+        for delay in self._poll_delays():
+            if await caching.redis.set(lock_key, token, nx=True, ex=Config.SINGLE_FLIGHT_LEASE_SECONDS):
+                result = await caching.redis.get(result_key)
+                if result is not None:
+                    await self._release_async(lock_key, token)
+                return result is None, result
+            result = await caching.redis.get(result_key)
+            if result is not None:
+                return False, result
+            if time.monotonic() >= deadline:
+                return False, None
+            await asyncio.sleep(delay)
+
+    async def run_async(self, key: str, fn: Callable[[], Awaitable[str]]) -> str:
+        """Same as run, for coroutines on the event loop."""
+        lock_key, result_key = self._keys(key)
+        token = uuid.uuid4().hex
+        try:
+            leading, result = await self._wait_async(key, token)
+        except Exception as e:
+            logger.error(f"Single-flight unavailable for {key}: {e}")
+            return await fn()
+
+        if result is not None:
+            logger.info(f"Single-flight reused the in-flight result for {key}")
+            return result
+        if not leading:
+            logger.warning(f"Single-flight wait timed out for {key}; calling directly")
+            return await fn()
+
+        try:
+            result = await fn()
+            try:
+                await caching.redis.set(result_key, result, ex=Config.SINGLE_FLIGHT_RESULT_TTL)
+            except Exception as e:
+                logger.error(f"Single-flight failed to share the result for {key}: {e}")
+            return result
+        finally:
+            await self._release_async(lock_key, token)
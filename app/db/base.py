@@ -1,19 +1,81 @@
 from sqlalchemy.orm import declarative_base
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
 from app.config import Config
+from app.core.logger import logger
+from app.db.pool import PoolStats, instrumented_pool_class
 
 
 Base = declarative_base()
 database_url=f"postgresql+psycopg2://{Config.DB_USERNAME}:{Config.DB_PASSWORD}@{Config.DB_HOST}:{Config.DB_PORT}/{Config.DB_NAME}"
+async_database_url=f"postgresql+asyncpg://{Config.DB_USERNAME}:{Config.DB_PASSWORD}@{Config.DB_HOST}:{Config.DB_PORT}/{Config.DB_NAME}"
 
-engine= create_engine(database_url, echo=True)
+pool_options = {
+    "echo": Config.DB_ECHO,
+    "pool_size": Config.DB_POOL_SIZE,
+    "max_overflow": Config.DB_MAX_OVERFLOW,
+    "pool_timeout": Config.DB_POOL_TIMEOUT,
+    "pool_recycle": Config.DB_POOL_RECYCLE,
+    "pool_pre_ping": Config.DB_POOL_PRE_PING,
+}
 
-# Create all tables
-Base.metadata.create_all(bind=engine)
-# To Check connection
-try:
-    connection = engine.connect()
-    print("Database connected successfully!")
-except Exception as e:
-    print(f"Failed to connect to the database: {e}")
\ No newline at end of file
+sync_pool_stats = PoolStats("sync")
+async_pool_stats = PoolStats("async")
+
+# Creating an engine opens no connections; the schema is owned by Alembic and
+# connections are checked/closed by init_db/close_db from the app lifespan.
+# Sync engine is used by the Celery workers, the async engine by the API
+engine= create_engine(
+    database_url,
+    poolclass=instrumented_pool_class(QueuePool, sync_pool_stats),
+    **pool_options,
+)
+async_engine = create_async_engine(
+    async_database_url,
+    poolclass=instrumented_pool_class(AsyncAdaptedQueuePool, async_pool_stats),
+    **pool_options,
+)
+
+replica_pool_stats = [PoolStats(f"replica-{index}") for index in range(len(Config.DB_REPLICA_URLS))]
+replica_engines = [
+    create_async_engine(
+        url,
+        poolclass=instrumented_pool_class(AsyncAdaptedQueuePool, stats),
+        **pool_options,
+    )
+    for url, stats in zip(Config.DB_REPLICA_URLS, replica_pool_stats)
+]
+
+
+async def init_db() -> None:
+    """
+    Verifies the database is reachable on startup.
+    """
+    try:
+        async with async_engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+        logger.info("Database connected successfully")
+    except Exception as e:
+        logger.error(f"Failed to connect to the database: {e}")
+
+
+async def close_db() -> None:
+    """
+    Closes every pooled connection on shutdown.
+    """
+    await async_engine.dispose()
+    for replica_engine in replica_engines:
+        await replica_engine.dispose()
+    engine.dispose()
+    logger.info("Database connection pools closed")
+
+
+def get_pool_stats() -> list:
+    """
+    Returns pool counters for every engine in this process.
+    """
+    return [sync_pool_stats.snapshot(), async_pool_stats.snapshot()] + [
+        stats.snapshot() for stats in replica_pool_stats
+    ]
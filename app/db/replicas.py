@@ -0,0 +1,108 @@
+import itertools
+import time
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+from app.core.logger import logger
+
+# Seconds the replica is behind the primary; 0 when it has replayed everything it received
+POSTGRES_LAG_QUERY = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+class _Replica:
+    def __init__(self, name: str, engine: AsyncEngine):
+        self.name = name
+        self.engine = engine
+        self.sessionmaker = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+        self.unavailable_until = 0.0
+        self.checked_at = 0.0
+        self.lag_seconds: Optional[float] = None
+
+    @property
+    def load(self) -> int:
+        return self.engine.pool.checkedout()
+
+
+class ReplicaRouter:
+    """
+    Hands out sessions for read-only queries. Replicas are picked round-robin
+    or by fewest checked-out connections; one that is down or lagging more
+    than ``max_lag_seconds`` is skipped for ``check_interval`` seconds, and
+    the primary is used when no replica is usable.
+    """
+
+    def __init__(
+        self,
+        primary: async_sessionmaker,
+        engines: List[AsyncEngine],
+        strategy: str = "round_robin",
+        max_lag_seconds: float = 5,
+        check_interval: float = 10,
+    ):
+        if strategy not in ("round_robin", "least_load"):
+            raise ValueError(f"Unknown replica strategy: {strategy}")
+        self.primary = primary
+        self.replicas = [_Replica(f"replica-{index}", engine) for index, engine in enumerate(engines)]
+        self.strategy = strategy
+        self.max_lag_seconds = max_lag_seconds
+        self.check_interval = check_interval
+        self._counter = itertools.count()
+
+    def _candidates(self) -> List[_Replica]:
+        now = time.monotonic()
+        available = [replica for replica in self.replicas if replica.unavailable_until <= now]
+        if not available:
+            return []
+        if self.strategy == "least_load":
+            return sorted(available, key=lambda replica: replica.load)
+        start = next(self._counter) % len(available)
+        return available[start:] + available[:start]
+
+    def _mark_unavailable(self, replica: _Replica, reason: str) -> None:
+        replica.unavailable_until = time.monotonic() + self.check_interval
+        logger.warning(f"Read replica {replica.name} skipped for {self.check_interval}s: {reason}")
+
+    async def _lag_ok(self, replica: _Replica, session: AsyncSession) -> bool:
+        if session.bind.dialect.name != "postgresql":
+            return True
+        now = time.monotonic()
+        if now - replica.checked_at >= self.check_interval:
+            result = await session.execute(POSTGRES_LAG_QUERY)
+            replica.lag_seconds = float(result.scalar() or 0)
+            replica.checked_at = now
+        return replica.lag_seconds <= self.max_lag_seconds
+
+    async def read_session(self) -> AsyncSession:
+        """
+        Returns a session with its connection already checked out, so a replica
+        that cannot be reached falls through to the next one instead of failing
+        the request.
+        """
+        for replica in self._candidates():
+            session = replica.sessionmaker()
+            try:
+                await session.connection()
+                if await self._lag_ok(replica, session):
+                    return session
+                self._mark_unavailable(replica, f"lag {replica.lag_seconds:.1f}s")
+            except Exception as e:
+                self._mark_unavailable(replica, str(e))
+            await session.close()
+        return self.primary()
+
+    def status(self) -> list:
+        now = time.monotonic()
+        return [
+            {
+                "replica": replica.name,
+                "available": replica.unavailable_until <= now,
+                "lag_seconds": replica.lag_seconds,
+                "checked_out": replica.load,
+            }
+            for replica in self.replicas
+        ]
@@ -1,13 +1,34 @@
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker
 
-from app.db.base import engine
+from app.config import Config
+from app.db.base import engine, async_engine, replica_engines
+from app.db.replicas import ReplicaRouter
 
+# Sync sessions for Celery workers and other code running outside the event loop
 SessionLocal= sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async sessions for request handlers
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+# Read-only sessions, served by a replica when one is configured and healthy
+read_router = ReplicaRouter(
+    AsyncSessionLocal,
+    replica_engines,
+    strategy=Config.DB_REPLICA_STRATEGY,
+    max_lag_seconds=Config.DB_REPLICA_MAX_LAG_SECONDS,
+    check_interval=Config.DB_REPLICA_CHECK_INTERVAL,
+)
+
 # Dependency
-def get_db():
-    db = SessionLocal()
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Dependency for read-only handlers; writes and read-your-own-writes paths use get_db
+async def get_read_db():
+    db = await read_router.read_session()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        await db.close()
@@ -0,0 +1,97 @@
+# Local stand-in for google.generativeai.GenerativeModel, used for offline
+# development and load tests (GEMINI_BACKEND=fake). Replies are generated
+# word by word with a fixed delay per chunk so streaming behaves like the
+# real API without any network access.
+
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+
+from app.config import Config
+
+FILLER_WORDS = (
+    "this is a locally generated reply used to exercise the streaming path "
+    "without calling the real model so latency and throughput can be measured offline"
+).split()
+
+
+class FakeTokenCount:
+    def __init__(self, total_tokens: int):
+        self.total_tokens = total_tokens
+
+
+class FakeChunk:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeResponse:
+    """Sync response; iterating yields chunks, ``text`` is the full reply."""
+
+    def __init__(self, chunks: List[str], delay: float):
+        self._chunks = chunks
+        self._delay = delay
+        self.text = "".join(chunks)
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            time.sleep(self._delay)
+            yield FakeChunk(chunk)
+
+
+class FakeAsyncResponse(FakeResponse):
+    async def __aiter__(self):
+        for chunk in self._chunks:
+            await asyncio.sleep(self._delay)
+            yield FakeChunk(chunk)
+
+
+def _parts_text(content: Any) -> str:
+    if isinstance(content, dict):
+        return " ".join(str(part) for part in content.get("parts", []))
+    return str(content)
+
+
+class FakeChatSession:
+    def __init__(self, model: "FakeGenerativeModel", history: Optional[List[Dict]] = None):
+        self.model = model
+        self.history = list(history or [])
+
+    def _reply_chunks(self, question: str) -> List[str]:
+        words = [f"Reply to '{question[:40]}':"] + [
+            FILLER_WORDS[index % len(FILLER_WORDS)] for index in range(self.model.reply_words)
+        ]
+        return [word + " " for word in words]
+
+    def send_message(self, content: Any, stream: bool = False, **kwargs) -> FakeResponse:
+        chunks = self._reply_chunks(_parts_text(content))
+        if not stream:
+            time.sleep(self.model.chunk_delay * len(chunks))
+        return FakeResponse(chunks, self.model.chunk_delay)
+
+    async def send_message_async(self, content: Any, stream: bool = False, **kwargs) -> FakeAsyncResponse:
+        chunks = self._reply_chunks(_parts_text(content))
+        if not stream:
+            await asyncio.sleep(self.model.chunk_delay * len(chunks))
+        return FakeAsyncResponse(chunks, self.model.chunk_delay)
+
+
+class FakeGenerativeModel:
+    def __init__(self, model_name: str, generation_config: Optional[Dict] = None, **kwargs):
+        self.model_name = model_name
+        self.generation_config = generation_config or {}
+        self.chunk_delay = Config.FAKE_GEMINI_CHUNK_DELAY
+        self.reply_words = Config.FAKE_GEMINI_REPLY_WORDS
+
+    def start_chat(self, history: Optional[List[Dict]] = None, **kwargs) -> FakeChatSession:
+        return FakeChatSession(self, history)
+
+    def generate_content(self, contents: Any, **kwargs) -> FakeResponse:
+        return FakeChatSession(self).send_message(contents)
+
+    def count_tokens(self, contents: Any) -> FakeTokenCount:
+        if isinstance(contents, list):
+            text = " ".join(_parts_text(content) for content in contents)
+        else:
+            text = _parts_text(contents)
+        return FakeTokenCount(len(text) // 4 + 1)
@@ -1,25 +1,150 @@
 # app/services/gemini_client.py
 
+import google.ai.generativelanguage as glm
 import google.generativeai as genai
-from typing import List, Dict
+from bisect import bisect_right
+from functools import lru_cache, partial
+from itertools import accumulate
+import hashlib
+import json
+from typing import AsyncIterator, List, Dict, Optional
+
+from google.api_core import exceptions as google_exceptions
 
 from app.config import Config
+from app.core import caching
+from app.core.circuit_breaker import CircuitBreaker, CircuitOpenError
 from app.core.logger import logger
+from app.core.single_flight import SingleFlight
+from app.integrations.token_estimator import token_estimator
 
 MAX_TOTAL_TOKENS = 8192
 MAX_OUTPUT_TOKENS = 1024
 MAX_INPUT_TOKENS = MAX_TOTAL_TOKENS - MAX_OUTPUT_TOKENS
 SAFE_INPUT_TOKENS = 7000
 
+DEFAULT_MODEL_NAME = "gemini-1.5-flash"
+
+DEFAULT_SYSTEM_PROMPT = (
+    "You are an intelligent and helpful AI assistant. Answer user questions clearly, accurately, "
+    "and concisely. Provide additional context or suggestions when helpful."
+)
+
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a user and an AI assistant. "
+    "Update the summary below with the new messages. Keep facts, names, decisions, open questions "
+    "and user preferences; drop small talk. Reply with the updated summary only."
+)
+
+
+def build_system_prompt(summary: str = "", model_prompt: str = DEFAULT_SYSTEM_PROMPT) -> str:
+    """
+    The system prompt, followed by the rolling summary of older history when there is one.
+    """
+    if not summary:
+        return model_prompt
+    return f"{model_prompt}\n\nSummary of the earlier conversation:\n{summary}"
+
+
+gemini_single_flight = SingleFlight("gemini_inflight")
+gemini_breaker = CircuitBreaker("gemini")
+
+# Upstream errors worth trying again later; anything else fails the same way every time
+RETRYABLE_ERRORS = (
+    google_exceptions.TooManyRequests,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.BadGateway,
+    google_exceptions.GatewayTimeout,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.Aborted,
+    google_exceptions.Unknown,
+    ConnectionError,
+    TimeoutError,
+)
+
+
+class GeminiError(Exception):
+    """
+    A Gemini call failed. ``retryable`` errors are transient (rate limits,
+    outages, timeouts); ``retry_after`` is set when we know how long to wait,
+    e.g. while the circuit breaker is open.
+    """
+
+    def __init__(self, message: str, retryable: bool = False, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+def classify_error(error: Exception) -> GeminiError:
+    if isinstance(error, GeminiError):
+        return error
+    if isinstance(error, CircuitOpenError):
+        return GeminiError(str(error), retryable=True, retry_after=error.retry_after)
+    return GeminiError(f"{type(error).__name__}: {error}", retryable=isinstance(error, RETRYABLE_ERRORS))
+
+# Pings keep the worker's idle HTTP/2 connection to the API open between tasks
+GRPC_KEEPALIVE_OPTIONS = [
+    ("grpc.keepalive_time_ms", Config.GEMINI_KEEPALIVE_SECONDS * 1000),
+    ("grpc.keepalive_timeout_ms", 20000),
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.max_pings_without_data", 0),
+]
+
+
+def _keepalive_channel(*args, options=(), **kwargs):
+    GrpcTransport = glm.GenerativeServiceClient.get_transport_class("grpc")
+    return GrpcTransport.create_channel(*args, options=list(options) + GRPC_KEEPALIVE_OPTIONS, **kwargs)
+
+
+def _generative_service_client() -> glm.GenerativeServiceClient:
+    """
+    Sync API client on a gRPC channel with keep-alive, used by the model in
+    place of the library's default client.
+    """
+    client_options = {"api_key": Config.GOOGLE_API_KEY}
+    if Config.GEMINI_API_ENDPOINT:
+        client_options["api_endpoint"] = Config.GEMINI_API_ENDPOINT
+    GrpcTransport = glm.GenerativeServiceClient.get_transport_class("grpc")
+    return glm.GenerativeServiceClient(
+        transport=partial(GrpcTransport, channel=_keepalive_channel),
+        client_options=client_options,
+    )
+
+
+@lru_cache(maxsize=None)
+def _configure_genai(api_key: str) -> None:
+    # configure() drops the library's cached API clients, so only run it once per process
+    genai.configure(api_key=api_key)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap local token estimate, used to size the history before it is sent.
+    """
+    return token_estimator.count(text)
+
+
+def history_token_budget(question: str, model_prompt: str = DEFAULT_SYSTEM_PROMPT) -> int:
+    """
+    Tokens left for chat history once the system prompt and question are in.
+    """
+    return max(SAFE_INPUT_TOKENS - estimate_tokens(model_prompt) - estimate_tokens(question), 0)
+
+
 class GeminiChatClient:
-    def __init__(self, model_name: str = "gemini-1.5-flash"):
+    def __init__(self, model_name: str = DEFAULT_MODEL_NAME):
         self.api_key = Config.GOOGLE_API_KEY
         self.model_name = model_name
         self._configure_client()
         self._initialize_model()
 
     def _configure_client(self):
-        genai.configure(api_key=self.api_key)
+        if Config.GEMINI_BACKEND != "fake":
+            _configure_genai(self.api_key)
 
     def _initialize_model(self):
         self.generation_config = {
@@ -30,10 +155,34 @@ class GeminiChatClient:
             "response_mime_type": "text/plain",
         }
 
-        self.model = genai.GenerativeModel(
+        if Config.GEMINI_BACKEND == "fake":
+            from app.integrations.fake_gemini import FakeGenerativeModel
+            model_class = FakeGenerativeModel
+        else:
+            model_class = genai.GenerativeModel
+
+        self.model = model_class(
             model_name=self.model_name,
             generation_config=self.generation_config
         )
+        if Config.GEMINI_BACKEND != "fake" and self.api_key:
+            self.model._client = _generative_service_client()
+
+    def close(self):
+        """Closes the API channel; the client must not be used afterwards."""
+        api_client = getattr(self.model, "_client", None)
+        if api_client is not None:
+            api_client.transport.close()
+
+    @staticmethod
+    def _build_history(chat_history: List[Dict[str, List[str]]], model_prompt: str) -> List[Dict[str, List[str]]]:
+        """
+        Prepends the system prompt and maps our sender names onto Gemini roles.
+        """
+        return [{"role": "model", "parts": [model_prompt]}] + [
+            {"role": "model" if turn["role"] == "gemini" else turn["role"], "parts": turn["parts"]}
+            for turn in chat_history
+        ]
 
     def count_prompt_tokens(self, full_history):
         try:
@@ -42,36 +191,259 @@ class GeminiChatClient:
             logger.error(f"Error counting tokens: {e}")
             return None
 
+    @staticmethod
+    def _fit_suffix(
+        chat_history: List[Dict[str, List[str]]],
+        question: str,
+        model_prompt: str,
+        correction: float = 1.0
+    ):
+        # Longest suffix whose estimate, times ``correction``, fits; returns (history, estimate) or None
+        fixed = token_estimator.count(model_prompt) + token_estimator.count_turn({"parts": [question]})
+        budget = SAFE_INPUT_TOKENS / correction - fixed
+        if budget < 0:
+            return None
+
+        # Running totals from the newest turn backwards; keep as many as fit
+        suffix_sums = list(accumulate(token_estimator.count_turn(turn) for turn in reversed(chat_history)))
+        keep = bisect_right(suffix_sums, budget)
+        estimated = fixed + (suffix_sums[keep - 1] if keep else 0)
+        if keep < len(chat_history):
+            logger.info(f"Dropped {len(chat_history) - keep} oldest messages to fit ~{estimated} tokens")
+        return chat_history[len(chat_history) - keep:], estimated
+
+    def fit_history(
+        self,
+        chat_history: List[Dict[str, List[str]]],
+        question: str,
+        model_prompt: str,
+        verify: bool = True
+    ) -> Optional[List[Dict[str, List[str]]]]:
+        """
+        Returns the longest suffix of ``chat_history`` that fits in SAFE_INPUT_TOKENS
+        next to the prompt and question, or None if even those do not fit.
+
+        Counts are local estimates. When ``verify`` is set and the estimate lands
+        within GEMINI_TOKEN_VERIFY_MARGIN of the limit, the prompt is counted once
+        by the API. If that shows it is over, the history is refitted with the
+        estimates scaled by the observed ratio, without another remote call; the
+        estimator itself is recalibrated more gently for later prompts.
+        """
+        fitted = self._fit_suffix(chat_history, question, model_prompt)
+        if fitted is None:
+            return None
+        history, estimated = fitted
+
+        if verify and Config.GEMINI_TOKEN_VERIFY and estimated >= SAFE_INPUT_TOKENS * (1 - Config.GEMINI_TOKEN_VERIFY_MARGIN):
+            counted = self.count_prompt_tokens(
+                self._build_history(history, model_prompt) + [{"role": "user", "parts": [question]}]
+            )
+            if counted:
+                if counted.total_tokens > SAFE_INPUT_TOKENS:
+                    fitted = self._fit_suffix(chat_history, question, model_prompt, counted.total_tokens / estimated)
+                    history = fitted[0] if fitted else None
+                token_estimator.calibrate(estimated, counted.total_tokens)
+        return history
+
+    def prompt_digest(
+        self,
+        history: List[Dict[str, List[str]]],
+        question: str,
+        model_prompt: str
+    ) -> str:
+        """
+        Digest identifying this exact prompt, for the response cache and single-flight.
+        """
+        prompt = {
+            "model": self.model_name,
+            "generation_config": self.generation_config,
+            "history": [[turn["role"], turn["parts"]] for turn in self._build_history(history, model_prompt)],
+            "question": question,
+        }
+        return hashlib.sha256(json.dumps(prompt, sort_keys=True).encode()).hexdigest()
+
+    @staticmethod
+    def is_cacheable(history: List[Dict[str, List[str]]], question: str) -> bool:
+        """Whether the reply may be served from the response cache (see the RESPONSE_CACHE_* settings)."""
+        return (
+            Config.RESPONSE_CACHE_ENABLED
+            and len(history) <= Config.RESPONSE_CACHE_MAX_HISTORY_TURNS
+            and len(question) <= Config.RESPONSE_CACHE_MAX_QUESTION_CHARS
+        )
+
     def get_response(
         self,
         chat_history: List[Dict[str, List[str]]],
         question: str,
         model_prompt: str
     ) -> str:
-        full_history = [{"role": "model", "parts": [model_prompt]}] + chat_history
+        history = self.fit_history(chat_history, question, model_prompt)
+        if history is None:
+            return (
+                "Your chat history is too long to continue.\n"
+                "Please create a new chatroom to start fresh."
+            )
+        full_history = self._build_history(history, model_prompt)
+
+        digest = self.prompt_digest(history, question, model_prompt)
+        cacheable = self.is_cacheable(history, question)
+        if cacheable:
+            cached = caching.get_cached_response_sync(digest)
+            if cached is not None:
+                return cached
+
+        def generate() -> str:
+            gemini_breaker.before_call()
+            try:
+                chat_session = self.model.start_chat(history=full_history)
+                text = chat_session.send_message(question).text
+            except Exception as e:
+                error = classify_error(e)
+                # Only transient failures say anything about upstream health
+                if error.retryable:
+                    gemini_breaker.record_failure()
+                else:
+                    gemini_breaker.record_success()
+                raise error from e
+            gemini_breaker.record_success()
+            if cacheable:
+                caching.set_cached_response_sync(digest, text)
+            return text
+
+        # Proceed with Gemini call; identical prompts in flight elsewhere share one call
+        try:
+            if Config.SINGLE_FLIGHT_ENABLED:
+                return gemini_single_flight.run(digest, generate)
+            return generate()
+        except Exception as e:
+            error = classify_error(e)
+            logger.error(f"Error getting response from Gemini (retryable={error.retryable}): {error}")
+            raise error from e
+
+    async def get_response_async(
+        self,
+        chat_history: List[Dict[str, List[str]]],
+        question: str,
+        model_prompt: str
+    ) -> str:
+        """
+        Same as get_response on the async API. The history is trimmed with local
+        estimates only, so nothing blocks the event loop.
+        """
+        history = self.fit_history(chat_history, question, model_prompt, verify=False)
+        if history is None:
+            return (
+                "Your chat history is too long to continue.\n"
+                "Please create a new chatroom to start fresh."
+            )
+        digest = self.prompt_digest(history, question, model_prompt)
+        cacheable = self.is_cacheable(history, question)
+        if cacheable:
+            cached = await caching.get_cached_response(digest)
+            if cached is not None:
+                return cached
+
+        async def generate() -> str:
+            await gemini_breaker.before_call_async()
+            try:
+                chat_session = self.model.start_chat(history=self._build_history(history, model_prompt))
+                text = (await chat_session.send_message_async(question)).text
+            except Exception as e:
+                error = classify_error(e)
+                if error.retryable:
+                    await gemini_breaker.record_failure_async()
+                else:
+                    await gemini_breaker.record_success_async()
+                raise error from e
+            await gemini_breaker.record_success_async()
+            if cacheable:
+                await caching.set_cached_response(digest, text)
+            return text
 
         try:
-            while True:
-                token_count = self.count_prompt_tokens(full_history)
-                if token_count and token_count.total_tokens < SAFE_INPUT_TOKENS:
-                    break
-
-                if len(full_history) <= 2:
-                    return (
-                        "Your chat history is too long to continue.\n"
-                        "Please create a new chatroom to start fresh."
-                    )
-
-                removed = full_history.pop(1)
-                logger.info(f"Dropped message to reduce tokens: {removed}")
+            if Config.SINGLE_FLIGHT_ENABLED:
+                return await gemini_single_flight.run_async(digest, generate)
+            return await generate()
         except Exception as e:
-            logger.error(f"Token trimming failed: {e}")
+            error = classify_error(e)
+            logger.error(f"Error getting response from Gemini (retryable={error.retryable}): {error}")
+            raise error from e
+
+    def summarize(self, summary: str, turns: List[Dict[str, List[str]]]) -> str:
+        """
+        Folds ``turns`` (oldest first) into ``summary`` and returns the new summary.
+        Errors are raised so the caller can leave the stored summary as it was.
+        """
+        transcript = "\n".join(
+            f"{'Assistant' if turn['role'] == 'gemini' else 'User'}: {' '.join(turn['parts'])}"
+            for turn in turns
+        )
+        prompt = (
+            f"{SUMMARY_PROMPT}\n\nCurrent summary:\n{summary or '(none)'}"
+            f"\n\nNew messages:\n{transcript}"
+        )
+        response = self.model.generate_content(
+            prompt,
+            generation_config={**self.generation_config, "temperature": 0.2, "max_output_tokens": Config.SUMMARY_MAX_TOKENS},
+        )
+        return response.text.strip()
+
+    async def stream_response(
+        self,
+        chat_history: List[Dict[str, List[str]]],
+        question: str,
+        model_prompt: str
+    ) -> AsyncIterator[str]:
+        """
+        Yields the reply text chunk by chunk as the model generates it.
+        The history is trimmed with local estimates only, to keep time to first token low.
+        Raises GeminiError without calling upstream while the circuit breaker is open.
+        """
+        history = self.fit_history(chat_history, question, model_prompt, verify=False) or []
+        cacheable = self.is_cacheable(history, question)
+        digest = self.prompt_digest(history, question, model_prompt)
+        if cacheable:
+            cached = await caching.get_cached_response(digest)
+            if cached is not None:
+                yield cached
+                return
 
-        # Proceed with Gemini call
         try:
-            chat_session = self.model.start_chat(history=full_history)
-            response = chat_session.send_message(question)
-            return response.text
+            await gemini_breaker.before_call_async()
+            chat_session = self.model.start_chat(history=self._build_history(history, model_prompt))
+            response = await chat_session.send_message_async(question, stream=True)
+            parts = []
+            async for chunk in response:
+                if chunk.text:
+                    parts.append(chunk.text)
+                    yield chunk.text
         except Exception as e:
-            logger.error(f"Error getting response from Gemini: {e}")
-            return "Error getting response from Gemini. Please try again."
+            error = classify_error(e)
+            if isinstance(e, CircuitOpenError):
+                pass
+            elif error.retryable:
+                await gemini_breaker.record_failure_async()
+            else:
+                await gemini_breaker.record_success_async()
+            raise error from e
+        await gemini_breaker.record_success_async()
+        if cacheable:
+            await caching.set_cached_response(digest, "".join(parts))
+
+
+@lru_cache(maxsize=None)
+def _gemini_client(model_name: str) -> GeminiChatClient:
+    return GeminiChatClient(model_name)
+
+
+def get_gemini_client(model_name: str = DEFAULT_MODEL_NAME) -> GeminiChatClient:
+    """
+    Process-wide client per model, so the model and its transport are built once.
+    Forked worker processes must call get_gemini_client.cache_clear() first,
+    as gRPC channels cannot be shared across a fork.
+    """
+    # Cached on the name itself, so get_gemini_client() and get_gemini_client(DEFAULT_MODEL_NAME) share a client
+    return _gemini_client(model_name)
+
+
+get_gemini_client.cache_clear = _gemini_client.cache_clear
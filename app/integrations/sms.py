@@ -0,0 +1,50 @@
+# SMS providers for OTP delivery. OTP_PROVIDER picks one: "local" for the
+# stub below, or "package.module:ClassName" for any SmsProvider subclass.
+
+import importlib
+import time
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Dict
+
+from app.config import Config
+from app.core.logger import logger
+
+
+class SmsProvider(ABC):
+    @abstractmethod
+    def send_bulk(self, messages: Dict[str, str]) -> None:
+        """
+        Sends one text per mobile number in a single provider call.
+        Raises if the batch was not accepted, so it can be sent again.
+        """
+
+
+class LocalSmsProvider(SmsProvider):
+    """
+    Stand-in for a real SMS gateway, for development and load tests: logs
+    each message and takes OTP_LOCAL_PROVIDER_LATENCY seconds per call,
+    however many messages the call carries.
+    """
+
+    def __init__(self, latency: float = None):
+        self.latency = Config.OTP_LOCAL_PROVIDER_LATENCY if latency is None else latency
+        self.calls = 0
+        self.messages = 0
+
+    def send_bulk(self, messages: Dict[str, str]) -> None:
+        time.sleep(self.latency)
+        self.calls += 1
+        self.messages += len(messages)
+        for mobile_number, text in messages.items():
+            logger.info(f"[Local SMS] {mobile_number}: {text}")
+
+
+@lru_cache(maxsize=None)
+def get_sms_provider() -> SmsProvider:
+    """Process-wide provider named by OTP_PROVIDER."""
+    if Config.OTP_PROVIDER == "local":
+        return LocalSmsProvider()
+    module_name, _, class_name = Config.OTP_PROVIDER.partition(":")
+    provider_class = getattr(importlib.import_module(module_name), class_name)
+    return provider_class()
@@ -0,0 +1,78 @@
+import hashlib
+import math
+import re
+import threading
+from typing import Dict, List
+
+from cachetools import LRUCache
+
+# Words and numbers, single punctuation marks, and any non-ASCII character on its own
+TOKEN_PATTERN = re.compile(r"[A-Za-z0-9_]+|[^\sA-Za-z0-9_]")
+CHARS_PER_WORD_TOKEN = 4
+# Role and separator tokens Gemini adds around each turn
+TURN_OVERHEAD_TOKENS = 3
+
+
+class TokenEstimator:
+    """
+    Local stand-in for ``GenerativeModel.count_tokens``.
+
+    Text is split into words, punctuation and non-ASCII characters; a word
+    costs one token per CHARS_PER_WORD_TOKEN characters, everything else one
+    token each. The raw count of each text is cached, and a scale factor,
+    calibrated against real counts from the API, is applied on top when the
+    count is read. Stored counts are raw for the same reason, so they follow
+    later calibration.
+    """
+
+    def __init__(self, cache_size: int = 10000, min_scale: float = 0.5, max_scale: float = 2.0):
+        self._cache = LRUCache(maxsize=cache_size)
+        self._lock = threading.Lock()
+        self.scale = 1.0
+        self.min_scale = min_scale
+        self.max_scale = max_scale
+
+    @staticmethod
+    def _raw_count(text: str) -> int:
+        return sum(
+            math.ceil(len(piece) / CHARS_PER_WORD_TOKEN) if piece[0].isascii() else 1
+            for piece in TOKEN_PATTERN.findall(text)
+        )
+
+    def raw_count(self, text: str) -> int:
+        key = hashlib.blake2b(text.encode(), digest_size=16).digest()
+        with self._lock:
+            count = self._cache.get(key)
+        if count is None:
+            count = self._raw_count(text)
+            with self._lock:
+                self._cache[key] = count
+        return count
+
+    def scaled(self, raw_count: int) -> int:
+        """Estimated tokens for a raw count, e.g. one stored with a message."""
+        return math.ceil(raw_count * self.scale) + 1
+
+    def count(self, text: str) -> int:
+        return self.scaled(self.raw_count(text))
+
+    def count_turn(self, turn: Dict[str, List[str]]) -> int:
+        """
+        Tokens for one history turn; uses the stored raw ``token_count`` when the turn carries one.
+        """
+        if turn.get("token_count") is not None:
+            return self.scaled(turn["token_count"]) + TURN_OVERHEAD_TOKENS
+        return sum(self.count(str(part)) for part in turn["parts"]) + TURN_OVERHEAD_TOKENS
+
+    def calibrate(self, estimated: int, actual: int, weight: float = 0.3) -> None:
+        """
+        Moves the scale towards ``actual / estimated`` (exponential moving average).
+        """
+        if estimated <= 0 or actual <= 0:
+            return
+        target = self.scale * actual / estimated
+        scale = (1 - weight) * self.scale + weight * target
+        self.scale = min(max(scale, self.min_scale), self.max_scale)
+
+
+token_estimator = TokenEstimator()
@@ -1,15 +1,30 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, status
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.db.base import init_db, close_db
+from app.core.pubsub import broadcaster
 from app.api.auth import auth_router
 from app.api.user import user_router
 from app.api.message import message_router
 from app.api.chatroom import chat_router
+from app.api.metrics import metrics_router
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await init_db()
+    yield
+    await broadcaster.close()
+    await close_db()
+
 
 app = FastAPI(
     title="gemini_backend_clone",
     version="1.0.0",
     description="A clone of the Gemini backend service",
+    lifespan=lifespan,
     responses={
         status.HTTP_404_NOT_FOUND: {
             "description": "Page not found"
@@ -38,4 +53,5 @@ async def root():
 app.include_router(auth_router)
 app.include_router(user_router)
 app.include_router(chat_router)
-app.include_router(message_router)
\ No newline at end of file
+app.include_router(message_router)
+app.include_router(metrics_router)
\ No newline at end of file
@@ -1,14 +1,18 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Text, DateTime, Enum
+from sqlalchemy import Column, Integer, String, ForeignKey, Text, DateTime, Enum, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
 
 from app.db.base import Base
+from app.integrations.token_estimator import token_estimator
 
 class SenderEnum(str, enum.Enum):
     user = "user"
     gemini = "gemini"
 
+def _content_tokens(context) -> int:
+    return token_estimator.raw_count(context.get_current_parameters()["content"])
+
 class Message(Base):
     __tablename__ = "messages"
 
@@ -16,7 +20,12 @@ class Message(Base):
     chatroom_id = Column(String, ForeignKey("chatrooms.id"),nullable=False)
     sender = Column(Enum(SenderEnum), nullable=False)
     content = Column(Text, nullable=False)
+    token_count = Column(Integer, nullable=False, default=_content_tokens)  # Raw estimator tokens of content, set on insert
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        Index("ix_messages_chatroom_created_id", "chatroom_id", "created_at", "id"),
+    )
+
     def __repr__(self):
         return f"<Chatroom(id={self.id}, title={self.title}, user_id={self.user_id})>"
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, Boolean, ForeignKey
+from sqlalchemy import Column, String, DateTime, Boolean, ForeignKey, Index
 from sqlalchemy.sql import func
 
 from app.db.base import Base
@@ -13,3 +13,8 @@ class OTP(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     expires_at = Column(DateTime(timezone=True), nullable=False)
     is_verified = Column(Boolean, default=False)
+
+    # Equality columns first, expires_at last for the range check in verify_otp
+    __table_args__ = (
+        Index("ix_otps_user_purpose_verified_expires", "user_id", "purpose", "is_verified", "expires_at"),
+    )
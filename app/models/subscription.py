@@ -13,7 +13,7 @@ class Subscription(Base):
     __tablename__ = "subscriptions"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(String, ForeignKey("users.id"),nullable=False)
+    user_id = Column(String, ForeignKey("users.id"),nullable=False, unique=True, index=True)
     tier = Column(Enum(SubscriptionTierEnum, name="subscription_tier_enum"), nullable=False, default=SubscriptionTierEnum.basic)
     start_date = Column(DateTime, server_default=func.now(), nullable=False)
     end_date = Column(DateTime, nullable=True)
@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, Text, DateTime
+from datetime import datetime
+
+from app.db.base import Base
+
+class ChatroomSummary(Base):
+    __tablename__ = "chatroom_summaries"
+
+    chatroom_id = Column(String, ForeignKey("chatrooms.id"), primary_key=True)
+    content = Column(Text, nullable=False, default="", server_default="")
+    summarized_through_id = Column(Integer, nullable=False, default=0, server_default="0")  # Newest message folded into content
+    token_count = Column(Integer, nullable=False, default=0, server_default="0")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<ChatroomSummary(chatroom_id={self.chatroom_id}, summarized_through_id={self.summarized_through_id})>"
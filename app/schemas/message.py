@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Literal
+from typing import Literal, Optional, List
 from datetime import datetime
 
 class MessageCreate(BaseModel):
@@ -14,3 +14,8 @@ class MessageRead(BaseModel):
     model_config = {
         "from_attributes": True
     }
+
+
+class MessagePage(BaseModel):
+    messages: List[MessageRead]
+    next_cursor: Optional[str] = None
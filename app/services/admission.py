@@ -0,0 +1,83 @@
+import math
+import time
+
+from fastapi import HTTPException, status
+
+from app.config import Config
+from app.workers import scheduler
+
+STATS_REFRESH_SECONDS = 1.0
+
+_stats_cache = {"fetched_at": 0.0, "stats": None}
+
+
+async def _recent_job_stats() -> dict:
+    # Every send_message checks admission, so read the job history at most once a second per process
+    now = time.monotonic()
+    if _stats_cache["stats"] is None or now - _stats_cache["fetched_at"] > STATS_REFRESH_SECONDS:
+        _stats_cache["stats"] = await scheduler.recent_job_stats()
+        _stats_cache["fetched_at"] = now
+    return _stats_cache["stats"]
+
+
+def _lane_share(tier: str, depths: dict) -> float:
+    """Share of the workers the tier's lane gets while the lanes with jobs waiting compete."""
+    busy = [lane for lane, depth in depths.items() if depth > 0 or lane == tier]
+    total = sum(max(Config.GEMINI_LANE_WEIGHTS.get(lane, 1), 1) for lane in busy)
+    return max(Config.GEMINI_LANE_WEIGHTS.get(tier, 1), 1) / total
+
+
+async def queue_status() -> dict:
+    """Live lane depths, admission thresholds and recent job timings."""
+    depths = await scheduler.lane_depths()
+    return {
+        "lanes": {
+            tier: {
+                "depth": depth,
+                "max_depth": Config.GEMINI_ADMISSION_MAX_DEPTH.get(tier),
+                "max_wait_seconds": Config.GEMINI_ADMISSION_MAX_WAIT_SECONDS.get(tier),
+                "weight": Config.GEMINI_LANE_WEIGHTS.get(tier, 1),
+            }
+            for tier, depth in depths.items()
+        },
+        "recent_jobs": await _recent_job_stats(),
+    }
+
+
+async def check_queue_admission(tier: str):
+    """
+    Rejects a new Gemini job with 429 when the tier's lane already holds
+    GEMINI_ADMISSION_MAX_DEPTH jobs, or when its recent jobs waited longer
+    than GEMINI_ADMISSION_MAX_WAIT_SECONDS in the queue. Retry-After is the
+    time the lane needs to drain back under the limit at its recent
+    completion rate.
+    """
+    depths = await scheduler.lane_depths()
+    stats = await _recent_job_stats()
+    lane_stats = stats.get(tier) or stats["all"]
+    depth = depths.get(tier, 0)
+    max_depth = Config.GEMINI_ADMISSION_MAX_DEPTH.get(tier)
+    max_wait = Config.GEMINI_ADMISSION_MAX_WAIT_SECONDS.get(tier)
+
+    retry_after = None
+    if max_depth is not None and depth >= max_depth:
+        excess = depth - max_depth + 1
+        drain_rate = lane_stats["throughput"]
+        if not drain_rate:
+            # Nothing from this lane finished recently; estimate its share of the overall rate
+            drain_rate = stats["all"]["throughput"] * _lane_share(tier, depths)
+        if drain_rate:
+            retry_after = excess / drain_rate
+        else:
+            # Nothing finished recently; assume the queue is stuck for at least the window
+            retry_after = Config.GEMINI_ADMISSION_MAX_RETRY_AFTER
+    elif max_wait is not None and lane_stats["wait_p50"] > max_wait:
+        retry_after = lane_stats["wait_p50"] - max_wait
+
+    if retry_after is not None:
+        seconds = min(max(math.ceil(retry_after), 1), Config.GEMINI_ADMISSION_MAX_RETRY_AFTER)
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="The assistant is busy right now. Please try again shortly.",
+            headers={"Retry-After": str(seconds)},
+        )
@@ -1,47 +1,53 @@
 from fastapi import HTTPException
 import uuid
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.responses import JSONResponse
 
 from app.schemas.chatroom import ChatroomCreate
 from app.models.chatroom import Chatroom
 from app.core.logger import logger
 
-def create_chatroom(db: Session, user_id: str, chatroom: ChatroomCreate) -> Chatroom:
+async def create_chatroom(db: AsyncSession, user_id: str, chatroom: ChatroomCreate) -> Chatroom:
     """
     Create a new chatroom for a user.
     """
     try:
         db_chatroom = Chatroom(id=str(uuid.uuid4()),user_id=user_id, title=chatroom.title)
         db.add(db_chatroom)
-        db.commit()
-        db.refresh(db_chatroom)
+        await db.commit()
+        await db.refresh(db_chatroom)
         logger.info(f"Chatroom created: {db_chatroom.id} by user: {user_id}")
         return db_chatroom
     except Exception as e:
+        await db.rollback()
         logger.error(f"Error creating chatroom for user {user_id}: {e}")
         raise HTTPException(
             status_code=500,
             detail="Failed to create chatroom"
         )
 
-def get_chatrooms(db: Session, user_id: int):
+async def get_chatrooms(db: AsyncSession, user_id: int):
     """ Retrieve all chatrooms for a user.
     """
     try:
-        chatrooms = db.query(Chatroom).filter(Chatroom.user_id == user_id).all()
+        result = await db.execute(select(Chatroom).where(Chatroom.user_id == user_id))
+        chatrooms = result.scalars().all()
         logger.info(f"Retrieved {len(chatrooms)} chatrooms for user {user_id}")
         return chatrooms
     except Exception as e:
         logger.error(f"Error retrieving chatrooms for user {user_id}: {e}")
         raise HTTPException(status_code=500, detail="Failed to retrieve chatrooms")
 
-def get_chatroom_by_id(db: Session, chatroom_id: int, user_id: int):
+async def get_chatroom_by_id(db: AsyncSession, chatroom_id: int, user_id: int):
     """
     Retrieve a chatroom by ID that belongs to a specific user.
     """
     try:
-        chatroom = db.query(Chatroom).filter(Chatroom.id == chatroom_id, Chatroom.user_id == user_id).first()
+        result = await db.execute(
+            select(Chatroom).where(Chatroom.id == chatroom_id, Chatroom.user_id == user_id)
+        )
+        chatroom = result.scalars().first()
     
         if not chatroom:
             logger.warning(f"Chatroom {chatroom_id} not found for user {user_id}")
@@ -52,4 +58,4 @@ def get_chatroom_by_id(db: Session, chatroom_id: int, user_id: int):
     except Exception as e:
         logger.error(f"Error retrieving chatroom {chatroom_id} for user {user_id}: {e}")
         raise HTTPException(status_code=404, detail="Chatroom not found")
-    
\ No newline at end of file
+    
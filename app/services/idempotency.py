@@ -0,0 +1,116 @@
+# Idempotency keys for POST endpoints that clients retry.
+#
+# The first request with a key claims it in Redis with a short lease and runs;
+# its response is then stored under the key for IDEMPOTENCY_TTL_SECONDS and
+# replayed to any retry with the same key. A duplicate arriving while the first
+# request is still running waits for its response instead of running again. If
+# the first request fails, the claim is dropped so a retry can run for real.
+
+import asyncio
+import hashlib
+import json
+import time
+import uuid
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, status
+
+from app.config import Config
+from app.core import caching
+from app.core.logger import logger
+
+MAX_KEY_LENGTH = 255
+MAX_POLL_SECONDS = 0.5
+
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def _key(scope: str, idempotency_key: str) -> str:
+    return f"idempotency:{scope}:{idempotency_key}"
+
+
+def request_fingerprint(*parts) -> str:
+    """Digest of what the request asked for, so a key reused for a different request is caught."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+async def claim(scope: str, idempotency_key: str, fingerprint: str) -> Tuple[Optional[str], Optional[dict]]:
+    """
+    Claims ``idempotency_key`` within ``scope`` (e.g. the user id) for this request.
+    Returns (claim, None) when the request should run, passing ``claim`` on to
+    complete or release, or (None, response) with the stored response of the
+    request that already ran with this key. Returns (None, None) when Redis
+    is unavailable and the request should run unprotected.
+    """
+    if len(idempotency_key) > MAX_KEY_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Idempotency-Key must be at most {MAX_KEY_LENGTH} characters"
+        )
+
+    key = _key(scope, idempotency_key)
+    pending = json.dumps({"state": "pending", "fingerprint": fingerprint, "token": uuid.uuid4().hex})
+    deadline = time.monotonic() + Config.IDEMPOTENCY_WAIT_SECONDS
+    delay = Config.SINGLE_FLIGHT_POLL_SECONDS
+    try:
+        while True:
+            if await caching.redis.set(key, pending, nx=True, ex=Config.IDEMPOTENCY_LEASE_SECONDS):
+                return pending, None
+
+            stored = await caching.redis.get(key)
+            if stored is None:
+                # The first request failed or its lease ran out; try to take over
+                continue
+            stored = json.loads(stored)
+            if stored["fingerprint"] != fingerprint:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail="Idempotency-Key was already used for a different request"
+                )
+            if stored["state"] == "done":
+                logger.info(f"Replaying stored response for idempotency key {key}")
+                return None, stored["response"]
+            if time.monotonic() >= deadline:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="A request with this Idempotency-Key is still in progress",
+                    headers={"Retry-After": "1"},
+                )
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_POLL_SECONDS)
+    except HTTPException:
+        raise
+    except Exception as e:
+        # Without Redis the request still runs, just without duplicate protection
+        logger.error(f"Idempotency unavailable for {key}: {e}")
+        return None, None
+
+
+async def complete(scope: str, idempotency_key: str, claimed: Optional[str], status_code: int, content: dict) -> None:
+    """Stores the response of a claimed request for replay to its retries."""
+    if claimed is None:
+        return
+    record = {
+        "state": "done",
+        "fingerprint": json.loads(claimed)["fingerprint"],
+        "response": {"status_code": status_code, "content": content},
+    }
+    try:
+        await caching.redis.set(_key(scope, idempotency_key), json.dumps(record), ex=Config.IDEMPOTENCY_TTL_SECONDS)
+    except Exception as e:
+        logger.error(f"Error storing idempotent response for key {idempotency_key}: {e}")
+
+
+async def release(scope: str, idempotency_key: str, claimed: Optional[str]) -> None:
+    """Drops the claim of a request that failed, so the next retry runs it."""
+    if claimed is None:
+        return
+    try:
+        await caching.redis.eval(RELEASE_SCRIPT, 1, _key(scope, idempotency_key), claimed)
+    except Exception as e:
+        logger.error(f"Error releasing idempotency key {idempotency_key}: {e}")
@@ -1,22 +1,50 @@
 from fastapi import HTTPException
+from datetime import datetime
+from typing import Optional, Tuple
+import base64
+import json
+
+from app.config import Config
+from app.core import caching
+from app.core.pubsub import publish_message, publish_message_sync
 from app.models.message import Message, SenderEnum
+from app.integrations.gemini import SAFE_INPUT_TOKENS
+from app.integrations.token_estimator import TURN_OVERHEAD_TOKENS, token_estimator
 from app.core.logger import logger
 
+from sqlalchemy import select, tuple_
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+
+def serialize_message(message: Message) -> dict:
+    """
+    JSON-ready representation of a message, as returned by the API and pushed to WebSockets.
+    """
+    return {
+        "id": message.id,
+        "chatroom_id": message.chatroom_id,
+        "sender": message.sender.value,
+        "content": message.content,
+        "created_at": message.created_at.isoformat()
+    }
 
-def create_user_message(db: Session, chatroom_id: int, content: str):
+
+async def create_user_message(db: AsyncSession, chatroom_id: int, content: str):
     """
     Create a message sent by the user in a chatroom.
     """
     try:
         msg = Message(chatroom_id=chatroom_id, sender=SenderEnum.user, content=content)
         db.add(msg)
-        db.commit()
-        db.refresh(msg)
+        await db.commit()
+        await db.refresh(msg)
+        await caching.append_cached_history(msg)
+        await publish_message(chatroom_id, serialize_message(msg))
         logger.info(f"Message created: {msg.id} by user: {chatroom_id}")
         return msg
         
     except Exception as e:
+        await db.rollback()
         logger.error(f"Error creating message for user {chatroom_id}: {e}")
         raise HTTPException(
             status_code=500,
@@ -27,12 +55,15 @@ def create_user_message(db: Session, chatroom_id: int, content: str):
 def create_gemini_message(db: Session, chatroom_id: int, content: str):
     """
     Create a message sent by Gemini in a chatroom.
+    Runs inside the Celery worker, so it uses a sync session.
     """
     try:
         msg = Message(chatroom_id=chatroom_id, sender=SenderEnum.gemini, content=content)
         db.add(msg)
         db.commit()
         db.refresh(msg)
+        caching.append_cached_history_sync(msg)
+        publish_message_sync(chatroom_id, serialize_message(msg))
         logger.info(f"Gemini message created: {msg.id} in chatroom: {chatroom_id}")
         return msg
     except Exception as e:
@@ -42,28 +73,213 @@ def create_gemini_message(db: Session, chatroom_id: int, content: str):
             detail="Failed to create Gemini message"
         )
 
-def get_messages(db: Session, chatroom_id: int):
+async def create_gemini_message_async(db: AsyncSession, chatroom_id: str, content: str):
     """
-    Retrieve all messages in a chatroom.
+    Create a message sent by Gemini from the API process (e.g. after a streamed reply).
     """
     try:
-        messages = db.query(Message).filter(Message.chatroom_id == chatroom_id).order_by(Message.created_at).all()
+        msg = Message(chatroom_id=chatroom_id, sender=SenderEnum.gemini, content=content)
+        db.add(msg)
+        await db.commit()
+        await db.refresh(msg)
+        await caching.append_cached_history(msg)
+        await publish_message(chatroom_id, serialize_message(msg))
+        logger.info(f"Gemini message created: {msg.id} in chatroom: {chatroom_id}")
+        return msg
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Error creating Gemini message for chatroom {chatroom_id}: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to create Gemini message"
+        )
+
+def encode_cursor(message: Message) -> str:
+    """
+    Encodes a message's (created_at, id) position as an opaque cursor.
+    """
+    raw = json.dumps([message.created_at.isoformat(), message.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Decodes a cursor produced by encode_cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, message_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), int(message_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+async def get_messages(
+    db: AsyncSession,
+    chatroom_id: int,
+    limit: int = 50,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+):
+    """
+    Retrieve one page of messages in a chatroom, oldest first.
+
+    Without a cursor, or with ``before``, the page holds the newest ``limit``
+    messages older than the cursor and ``next_cursor`` continues towards older
+    messages. With ``after`` the page holds the oldest ``limit`` messages newer
+    than the cursor and ``next_cursor`` continues towards newer ones.
+    ``next_cursor`` is None when there is nothing more in that direction.
+    """
+    position = tuple_(Message.created_at, Message.id)
+    query = select(Message).where(Message.chatroom_id == chatroom_id)
+    if after:
+        query = query.where(position > decode_cursor(after)).order_by(Message.created_at, Message.id)
+    else:
+        if before:
+            query = query.where(position < decode_cursor(before))
+        query = query.order_by(Message.created_at.desc(), Message.id.desc())
+
+    try:
+        # One extra row tells us whether another page exists
+        result = await db.execute(query.limit(limit + 1))
+        messages = list(result.scalars().all())
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+        next_cursor = encode_cursor(messages[-1]) if has_more else None
+        if not after:
+            messages.reverse()
         logger.info(f"Retrieved {len(messages)} messages for chatroom {chatroom_id}")
-        return messages
+        return messages, next_cursor
     except Exception as e:
         logger.error(f"Error retrieving messages for chatroom {chatroom_id}: {e}")
         raise HTTPException(status_code=500, detail="Failed to retrieve messages")
     
     
 
-def get_chat_history(db: Session, chatroom_id: str):
+def message_tokens(message: Message) -> int:
+    """
+    Prompt tokens a stored message costs as a history turn.
+    """
+    token_count = message.token_count
+    if token_count is None:
+        # Entries cached before token counts were stored
+        token_count = token_estimator.raw_count(message.content)
+    return token_estimator.scaled(token_count) + TURN_OVERHEAD_TOKENS
+
+
+def _fit_budget(
+    messages: list,
+    token_budget: int,
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+) -> Tuple[list, bool]:
+    """
+    Keeps the newest messages (given oldest first) that fit in ``token_budget``,
+    using the token counts stored with each message. Also reports whether any
+    message newer than ``after_id`` had to be left out.
+    """
+    candidates = [
+        message for message in messages
+        if (before_id is None or message.id < before_id) and (after_id is None or message.id > after_id)
+    ]
+    kept = []
+    used_tokens = 0
+    for message in reversed(candidates):
+        cost = message_tokens(message)
+        if used_tokens + cost > token_budget:
+            break
+        used_tokens += cost
+        kept.append(message)
+    kept.reverse()
+    return kept, len(kept) < len(candidates)
+
+
+def _cached_messages(chatroom_id: str, cached: list) -> list:
+    return [
+        Message(
+            id=entry["id"], chatroom_id=chatroom_id, sender=SenderEnum(entry["sender"]),
+            content=entry["content"], token_count=entry.get("token_count"),
+        )
+        for entry in cached
+    ]
+
+
+def _recent_messages_query(chatroom_id: str):
+    return (
+        select(Message).where(Message.chatroom_id == chatroom_id)
+        .order_by(Message.created_at.desc(), Message.id.desc())
+        .limit(Config.HISTORY_CACHE_SIZE)
+    )
+
+
+def _history_window(messages: list, token_budget: int, before_id: Optional[int], after_id: Optional[int]):
+    kept, truncated = _fit_budget(messages, token_budget, before_id, after_id)
+    # A full window may have older unsummarized messages behind it, unless
+    # everything below its oldest message is already in the summary
+    if not truncated and len(messages) >= Config.HISTORY_CACHE_SIZE and messages[0].id > (after_id or 0) + 1:
+        truncated = True
+    return kept, truncated
+
+
+async def get_chat_history(
+    db: AsyncSession,
+    chatroom_id: str,
+    token_budget: int = SAFE_INPUT_TOKENS,
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+):
     """
-    Fetch all messages for a given chatroom, ordered by creation time.
+    Fetch the newest messages of a chatroom that fit in ``token_budget``,
+    returned oldest first. ``before_id`` excludes that message and anything
+    newer, e.g. the user message being answered; ``after_id`` excludes that
+    message and anything older, e.g. what is already in the chat summary.
+
+    The last HISTORY_CACHE_SIZE messages are served from the Redis history
+    cache; on a miss they are read newest first with one limited query and
+    the cache is rebuilt from them.
+
+    Returns the messages and whether older messages after ``after_id`` did not
+    fit (including any beyond the cached window).
     """
     try:
-        messages = db.query(Message).filter(Message.chatroom_id == chatroom_id).order_by(Message.created_at).all()
-        logger.info(f"Chat history retrieved for chatroom {chatroom_id} with {len(messages)} messages")
-        return messages
+        cached = await caching.get_cached_history(chatroom_id)
+        if cached is not None:
+            messages = _cached_messages(chatroom_id, cached)
+        else:
+            version = await caching.get_history_version(chatroom_id)
+            result = await db.execute(_recent_messages_query(chatroom_id))
+            messages = list(reversed(result.scalars().all()))
+            await caching.rebuild_cached_history(chatroom_id, messages, version)
+
+        kept, truncated = _history_window(messages, token_budget, before_id, after_id)
+        logger.info(f"Chat history retrieved for chatroom {chatroom_id} with {len(kept)} messages")
+        return kept, truncated
     except Exception as e:
         logger.error(f"Error retrieving chat history for chatroom {chatroom_id}: {e}")
         raise HTTPException(status_code=500, detail="Failed to retrieve chat history")
+
+
+def get_chat_history_sync(
+    db: Session,
+    chatroom_id: str,
+    token_budget: int = SAFE_INPUT_TOKENS,
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+):
+    """
+    Same as get_chat_history, for Celery workers.
+    """
+    cached = caching.get_cached_history_sync(chatroom_id)
+    if cached is not None:
+        messages = _cached_messages(chatroom_id, cached)
+    else:
+        version = caching.get_history_version_sync(chatroom_id)
+        messages = list(reversed(db.execute(_recent_messages_query(chatroom_id)).scalars().all()))
+        caching.rebuild_cached_history_sync(chatroom_id, messages, version)
+
+    kept, truncated = _history_window(messages, token_budget, before_id, after_id)
+    logger.info(f"Chat history retrieved for chatroom {chatroom_id} with {len(kept)} messages")
+    return kept, truncated
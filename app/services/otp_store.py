@@ -0,0 +1,120 @@
+# Where pending OTPs live: Redis (OTP_BACKEND=redis) or the Postgres otps table
+# (OTP_BACKEND=postgres).
+#
+# In Redis each user and purpose has one pending code, in a hash that expires
+# with the code. A single Lua script checks the code, consumes it on a match
+# and counts failed attempts, so two concurrent verifications can never both
+# succeed and guessing stops after OTP_MAX_ATTEMPTS.
+#
+# Moving hot traffic off the table: switch OTP_BACKEND to redis with
+# OTP_POSTGRES_FALLBACK on. New codes go to Redis, and codes issued before the
+# switch (or while Redis was unreachable) are still accepted from the table
+# until they expire. After OTP_TTL_SECONDS nothing live is left in the table;
+# scripts/purge_otps.py empties it, and the fallback can be turned off.
+
+from datetime import datetime, timedelta
+from typing import Optional
+import uuid
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import Config
+from app.core import caching
+from app.core.logger import logger
+from app.models.otp import OTP
+
+# KEYS: otp key. ARGV: code, max attempts. Returns 1 if consumed, 0 if wrong, -1 if none pending.
+VERIFY_SCRIPT = """
+local code = redis.call('HGET', KEYS[1], 'code')
+if not code then
+    return -1
+end
+if code == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    return 1
+end
+if redis.call('HINCRBY', KEYS[1], 'attempts', 1) >= tonumber(ARGV[2]) then
+    redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def otp_key(user_id: str, purpose: str) -> str:
+    return f"otp:{user_id}:{purpose}"
+
+
+async def _store_redis(user_id: str, purpose: str, otp_code: str) -> None:
+    # A new code replaces the pending one and resets its attempts
+    key = otp_key(user_id, purpose)
+    async with caching.redis.pipeline(transaction=True) as pipe:
+        pipe.delete(key)
+        pipe.hset(key, mapping={"code": otp_code, "attempts": 0})
+        pipe.expire(key, Config.OTP_TTL_SECONDS)
+        await pipe.execute()
+
+
+async def _consume_redis(user_id: str, purpose: str, otp_code: str) -> Optional[bool]:
+    """True if consumed, False if wrong, None if no code is pending."""
+    result = await caching.redis.eval(VERIFY_SCRIPT, 1, otp_key(user_id, purpose), otp_code, Config.OTP_MAX_ATTEMPTS)
+    if result == -1:
+        return None
+    return result == 1
+
+
+async def _store_postgres(db: AsyncSession, user_id: str, purpose: str, otp_code: str) -> None:
+    db.add(OTP(
+        id=str(uuid.uuid4()),
+        user_id=user_id,
+        otp_code=otp_code,
+        purpose=purpose,
+        expires_at=datetime.utcnow() + timedelta(seconds=Config.OTP_TTL_SECONDS),
+    ))
+    await db.commit()
+
+
+async def _consume_postgres(db: AsyncSession, user_id: str, purpose: str, otp_code: str) -> bool:
+    result = await db.execute(select(OTP).where(
+        OTP.user_id == user_id,
+        OTP.otp_code == otp_code,
+        OTP.purpose == purpose,
+        OTP.expires_at >= datetime.utcnow(),
+        OTP.is_verified == False
+    ))
+    otp_entry = result.scalars().first()
+    if not otp_entry:
+        return False
+    otp_entry.is_verified = True
+    await db.commit()
+    return True
+
+
+async def store_otp(db: AsyncSession, user_id: str, purpose: str, otp_code: str) -> None:
+    """Saves a newly issued code. Raises if it could not be stored anywhere."""
+    if Config.OTP_BACKEND == "redis":
+        try:
+            await _store_redis(user_id, purpose, otp_code)
+            return
+        except Exception as e:
+            if not Config.OTP_POSTGRES_FALLBACK:
+                raise
+            logger.error(f"Redis OTP store unavailable, using Postgres for user {user_id}: {e}")
+    await _store_postgres(db, user_id, purpose, otp_code)
+
+
+async def consume_otp(db: AsyncSession, user_id: str, purpose: str, otp_code: str) -> bool:
+    """
+    Checks ``otp_code`` against the pending code and consumes it on a match;
+    a code can be consumed only once.
+    """
+    if Config.OTP_BACKEND == "redis":
+        try:
+            consumed = await _consume_redis(user_id, purpose, otp_code)
+            if consumed is not None or not Config.OTP_POSTGRES_FALLBACK:
+                return bool(consumed)
+        except Exception as e:
+            if not Config.OTP_POSTGRES_FALLBACK:
+                raise
+            logger.error(f"Redis OTP store unavailable, checking Postgres for user {user_id}: {e}")
+    return await _consume_postgres(db, user_id, purpose, otp_code)
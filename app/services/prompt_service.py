@@ -0,0 +1,58 @@
+from typing import Dict, List, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import Config
+from app.core import caching
+from app.integrations.gemini import build_system_prompt, history_token_budget
+from app.services import message_service, summary_service
+from app.workers.summary_task import summarize_chatroom
+from app.core.logger import logger
+
+
+def _history_budget(summary: dict, question: str) -> int:
+    # Older history is covered by the summary; only the recent tail is sent verbatim
+    return min(history_token_budget(question, build_system_prompt(summary["content"])), Config.SUMMARY_TAIL_TOKENS)
+
+
+def _oldest_sent_id(messages: list, message_id: int) -> int:
+    # Everything before this goes into the summary; it is what the prompt no longer carries verbatim
+    return messages[0].id if messages else message_id
+
+
+def _history_turns(messages: list) -> List[Dict]:
+    return [
+        {"role": msg.sender.value, "parts": [msg.content], "token_count": msg.token_count}
+        for msg in messages
+    ]
+
+
+async def build_prompt(db: AsyncSession, chatroom_id: str, message_id: int, question: str) -> Tuple[str, List[Dict]]:
+    """
+    Returns the system prompt (with the chatroom summary) and the recent history
+    to send with the user message ``message_id``. Queues a summary update when
+    older history no longer fits, folding everything older than the history sent.
+    """
+    summary = await summary_service.get_summary(db, chatroom_id)
+    messages, truncated = await message_service.get_chat_history(
+        db, chatroom_id, token_budget=_history_budget(summary, question),
+        before_id=message_id, after_id=summary["through_id"],
+    )
+    if truncated and await caching.claim_summary_run(chatroom_id):
+        summarize_chatroom.delay(chatroom_id=chatroom_id, keep_from_id=_oldest_sent_id(messages, message_id))
+    return build_system_prompt(summary["content"]), _history_turns(messages)
+
+
+def build_prompt_sync(db: Session, chatroom_id: str, message_id: int, question: str) -> Tuple[str, List[Dict]]:
+    """
+    Same as build_prompt, for Celery workers.
+    """
+    summary = summary_service.get_summary_sync(db, chatroom_id)
+    messages, truncated = message_service.get_chat_history_sync(
+        db, chatroom_id, token_budget=_history_budget(summary, question),
+        before_id=message_id, after_id=summary["through_id"],
+    )
+    if truncated and caching.claim_summary_run_sync(chatroom_id):
+        logger.info(f"Queueing summary update for chatroom {chatroom_id}")
+        summarize_chatroom.delay(chatroom_id=chatroom_id, keep_from_id=_oldest_sent_id(messages, message_id))
+    return build_system_prompt(summary["content"]), _history_turns(messages)
@@ -1,8 +1,10 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
 from fastapi.responses import JSONResponse
 
 from app.integrations.stripe import StripeClient
-from app.db.session import SessionLocal
+from app.db.session import AsyncSessionLocal
 from app.models.subscription import Subscription, SubscriptionTierEnum
 from app.core.logger import logger
 
@@ -40,25 +42,24 @@ class SubscriptionService:
 
                 logger.info(f"Stripe checkout completed for user_id: {user_id}")
 
-                try:
-                    db: Session = SessionLocal()
+                async with AsyncSessionLocal() as db:
+                    try:
+                        # Step 3: Create or update subscription
+                        result = await db.execute(select(Subscription).where(Subscription.user_id == user_id))
+                        subscription = result.scalars().first()
+                        if subscription:
+                            subscription.tier = SubscriptionTierEnum.pro
+                            logger.info(f"Updated existing subscription to Pro for user {user_id}")
+                        else:
+                            new_subscription = Subscription(user_id=user_id, tier=SubscriptionTierEnum.pro)
+                            db.add(new_subscription)
+                            logger.info(f"Created new Pro subscription for user {user_id}")
 
-                    # Step 3: Create or update subscription
-                    subscription = db.query(Subscription).filter(Subscription.user_id == user_id).first()
-                    if subscription:
-                        subscription.tier = "Pro"
-                        logger.info(f"Updated existing subscription to Pro for user {user_id}")
-                    else:
-                        new_subscription = subscription(user_id=user_id, tier="Pro")
-                        db.add(new_subscription)
-                        logger.info(f"Created new Pro subscription for user {user_id}")
-
-                    db.commit()
-                except Exception as db_error:
-                    logger.error(f"Failed to update subscription in DB for user {user_id}: {db_error}")
-                    return JSONResponse(status_code=500, content={"error": "Failed to update subscription"})
-                finally:
-                    db.close()
+                        await db.commit()
+                    except Exception as db_error:
+                        await db.rollback()
+                        logger.error(f"Failed to update subscription in DB for user {user_id}: {db_error}")
+                        return JSONResponse(status_code=500, content={"error": "Failed to update subscription"})
 
             return JSONResponse(status_code=200, content={"message": "Webhook processed successfully"})
         except Exception as e:
@@ -66,14 +67,18 @@ class SubscriptionService:
             return JSONResponse(status_code=500, content={"error": "Failed to process webhook"})
 
     @staticmethod
-    async def get_status(user_id: str):
+    async def get_status(user_id: str, db: Optional[AsyncSession] = None):
         """        Retrieves the subscription status for a user.
         Returns the subscription tier (Basic or Pro).
+        Pass the request's session as ``db`` to avoid checking out a second connection.
         """
-        db = SessionLocal()
         try:
-            
-            subscription = db.query(Subscription).filter(Subscription.user_id == user_id).first()
+            query = select(Subscription).where(Subscription.user_id == user_id)
+            if db is not None:
+                subscription = (await db.execute(query)).scalars().first()
+            else:
+                async with AsyncSessionLocal() as session:
+                    subscription = (await session.execute(query)).scalars().first()
             tier=subscription.tier.value if subscription else SubscriptionTierEnum.basic.value
 
             logger.info(f"Fetched subscription tier '{tier}' for user {user_id}")
@@ -88,6 +93,4 @@ class SubscriptionService:
                 status_code=500,
                 content={"error": "Failed to retrieve subscription status"}
             )
-        finally:
-            db.close()
       
\ No newline at end of file
@@ -0,0 +1,123 @@
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import Config
+from app.core import caching
+from app.models.message import Message
+from app.models.summary import ChatroomSummary
+from app.integrations.gemini import GeminiChatClient, estimate_tokens
+from app.services.message_service import message_tokens
+from app.core.logger import logger
+
+EMPTY_SUMMARY = {"content": "", "through_id": 0}
+
+
+def _summary_dict(summary: ChatroomSummary) -> dict:
+    return {"content": summary.content, "through_id": summary.summarized_through_id}
+
+
+async def get_summary(db: AsyncSession, chatroom_id: str) -> dict:
+    """
+    Retrieve the rolling summary of a chatroom as {"content", "through_id"},
+    where ``through_id`` is the newest message already folded into it.
+    Served from Redis; a miss reads the summary row and caches it.
+    """
+    cached = await caching.get_cached_summary(chatroom_id)
+    if cached is not None:
+        return cached
+    try:
+        summary = await db.get(ChatroomSummary, chatroom_id)
+    except Exception as e:
+        logger.error(f"Error retrieving summary for chatroom {chatroom_id}: {e}")
+        return EMPTY_SUMMARY
+    data = _summary_dict(summary) if summary else EMPTY_SUMMARY
+    await caching.set_cached_summary(chatroom_id, data)
+    return data
+
+
+def get_summary_sync(db: Session, chatroom_id: str) -> dict:
+    """
+    Same as get_summary, for Celery workers.
+    """
+    cached = caching.get_cached_summary_sync(chatroom_id)
+    if cached is not None:
+        return cached
+    try:
+        summary = db.get(ChatroomSummary, chatroom_id)
+    except Exception as e:
+        logger.error(f"Error retrieving summary for chatroom {chatroom_id}: {e}")
+        return EMPTY_SUMMARY
+    data = _summary_dict(summary) if summary else EMPTY_SUMMARY
+    caching.set_cached_summary_sync(chatroom_id, data)
+    return data
+
+
+def _old_message_batches(db: Session, chatroom_id: str, through_id: int, keep_from_id: int):
+    """
+    Splits the messages after ``through_id`` and before ``keep_from_id`` (the
+    oldest message still sent verbatim) into id batches of about
+    SUMMARY_FOLD_TOKENS each.
+    """
+    rows = db.execute(
+        select(Message.id, Message.token_count)
+        .where(Message.chatroom_id == chatroom_id, Message.id > through_id, Message.id < keep_from_id)
+        .order_by(Message.id)
+    ).all()
+
+    batches, batch, batch_tokens = [], [], 0
+    for row in rows:
+        cost = message_tokens(row)
+        if batch and batch_tokens + cost > Config.SUMMARY_FOLD_TOKENS:
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(row.id)
+        batch_tokens += cost
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def fold_old_messages(db: Session, chatroom_id: str, client: GeminiChatClient, keep_from_id: int) -> int:
+    """
+    Folds the messages older than ``keep_from_id``, which prompts no longer
+    send verbatim, into the chatroom's summary, one batch per model call,
+    committing after each batch so a failure only loses the batch in flight.
+    Returns the number of messages folded.
+    """
+    summary = db.get(ChatroomSummary, chatroom_id)
+    if summary is None:
+        summary = ChatroomSummary(chatroom_id=chatroom_id, content="", summarized_through_id=0, token_count=0)
+        db.add(summary)
+
+    folded = 0
+    complete = True
+    for batch in _old_message_batches(db, chatroom_id, summary.summarized_through_id, keep_from_id):
+        messages = db.execute(
+            select(Message).where(Message.id.in_(batch)).order_by(Message.id)
+        ).scalars().all()
+        turns = [{"role": message.sender.value, "parts": [message.content]} for message in messages]
+        try:
+            content = client.summarize(summary.content, turns)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error summarizing chatroom {chatroom_id}: {e}")
+            complete = False
+            break
+
+        summary.content = content
+        summary.summarized_through_id = batch[-1]
+        summary.token_count = estimate_tokens(content)
+        db.commit()
+        caching.set_cached_summary_sync(chatroom_id, _summary_dict(summary))
+        folded += len(batch)
+
+    if complete and summary.summarized_through_id < keep_from_id - 1:
+        # Everything below keep_from_id is covered now, so history windows that
+        # start there are not reported as truncated again
+        summary.summarized_through_id = keep_from_id - 1
+        db.commit()
+        caching.set_cached_summary_sync(chatroom_id, _summary_dict(summary))
+
+    logger.info(f"Folded {folded} messages into the summary of chatroom {chatroom_id}")
+    return folded
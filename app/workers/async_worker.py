@@ -0,0 +1,156 @@
+# Asyncio worker for message_queue: an alternative to Celery prefork workers
+# for process_gemini_response. Gemini calls are almost all network wait, so one
+# process runs up to ASYNC_WORKER_CONCURRENCY of them at once on an event loop
+# instead of one blocking call per process.
+#
+#     python -m app.workers.async_worker
+#
+# Messages are read from the same broker queue the Celery workers use, so both
+# kinds of worker can run side by side. A message is acknowledged once its
+# reply is stored; messages still in flight when the worker stops are
+# redelivered by the broker.
+
+import asyncio
+import signal
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from app.config import Config
+from app.db.session import AsyncSessionLocal
+from app.integrations.gemini import DEFAULT_MODEL_NAME, GeminiError, get_gemini_client
+from app.models.message import Message
+from app.services.prompt_service import build_prompt
+from app.workers import scheduler
+from app.workers.message_task import (
+    process_gemini_response, retry_or_give_up, run_next_gemini_job, save_gemini_response,
+)
+from app.workers.queue import Celery_app
+from app.core.logger import logger
+
+QUEUE_NAME = "message_queue"
+
+
+class AsyncGeminiWorker:
+    def __init__(self, concurrency: int = Config.ASYNC_WORKER_CONCURRENCY,
+                 model_limits: Dict[str, int] = Config.GEMINI_MODEL_CONCURRENCY):
+        self.concurrency = concurrency
+        self.slots = asyncio.Semaphore(concurrency)
+        self.model_slots = {model: asyncio.Semaphore(limit) for model, limit in model_limits.items()}
+        self.in_flight = 0
+        self.stopping = threading.Event()
+        self._to_ack = deque()
+
+    async def handle(self, chatroom_id: str, message_id: int, model_name: str = DEFAULT_MODEL_NAME):
+        """
+        Async counterpart of process_gemini_response: the prompt is loaded and
+        Gemini called on the event loop, and the reply is stored through the
+        same sync write path.
+        """
+        async with AsyncSessionLocal() as db:
+            message = await db.get(Message, message_id)
+            if message is None:
+                logger.warning(f"Message {message_id} in chatroom {chatroom_id} no longer exists; skipping")
+                return
+            model_prompt, chat_history = await build_prompt(db, chatroom_id, message_id, message.content)
+
+        model_slot = self.model_slots.get(model_name)
+        async with self.slots:
+            if model_slot is not None:
+                await model_slot.acquire()
+            try:
+                logger.info(f"Processing Gemini response for chatroom {chatroom_id}")
+                response = await get_gemini_client(model_name).get_response_async(
+                    chat_history, message.content, model_prompt
+                )
+            finally:
+                if model_slot is not None:
+                    model_slot.release()
+        await asyncio.to_thread(save_gemini_response, chatroom_id, response)
+
+    async def _run(self, message, kwargs: Optional[dict]):
+        job, retries = kwargs, message.headers.get("retries") or 0
+        try:
+            eta = message.headers.get("eta")
+            if eta:
+                # A retry scheduled with a countdown; Celery workers hold these too
+                delay = (datetime.fromisoformat(eta) - datetime.now(timezone.utc)).total_seconds()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            if kwargs is None:
+                # run_next_gemini_job: the fair scheduler picks the job
+                entry = await scheduler.next_job_async()
+                if entry is None:
+                    return
+                job, started_at = entry["job"], time.time()
+                try:
+                    await self.handle(**job)
+                finally:
+                    await scheduler.record_completion_async(entry["lane"], entry["submitted_at"], started_at)
+            else:
+                await self.handle(**kwargs)
+        except GeminiError as e:
+            await asyncio.to_thread(retry_or_give_up, job, retries, e)
+        except Exception as e:
+            logger.error(f"Failed to process message task {message.headers.get('id')}: {e}")
+        finally:
+            self._to_ack.append(message)
+
+    def _consume(self, loop: asyncio.AbstractEventLoop):
+        """
+        Runs in a thread: reads task messages from the broker and hands them to
+        the event loop. The broker connection is only used from this thread,
+        so acks are queued by the loop and sent from here.
+        """
+        with Celery_app.connection_for_read() as connection:
+            queue = Celery_app.amqp.queues[QUEUE_NAME]
+
+            def on_message(body, message):
+                task_name = message.headers.get("task")
+                if task_name == run_next_gemini_job.name:
+                    kwargs = None
+                elif task_name == process_gemini_response.name:
+                    args, kwargs, _ = body
+                    if args:
+                        kwargs = dict(zip(("chatroom_id", "message_id", "model_name"), args), **kwargs)
+                else:
+                    logger.error(f"Async worker cannot run task {task_name}; rejecting it")
+                    message.reject()
+                    return
+                self.in_flight += 1
+                asyncio.run_coroutine_threadsafe(self._run(message, kwargs), loop)
+
+            with connection.Consumer(queue, callbacks=[on_message], accept=["json"]) as consumer:
+                # Never hold more unacknowledged messages than we can run
+                consumer.qos(prefetch_count=self.concurrency)
+                logger.info(f"Async worker consuming {QUEUE_NAME} with concurrency {self.concurrency}")
+                while not self.stopping.is_set():
+                    self._ack_finished()
+                    try:
+                        connection.drain_events(timeout=0.2)
+                    except TimeoutError:
+                        pass
+                consumer.cancel()
+
+                # Let the jobs already started finish so their messages are acknowledged
+                while self.in_flight:
+                    self._ack_finished()
+                    self.stopping.wait(0.1)
+
+    def _ack_finished(self):
+        while self._to_ack:
+            self._to_ack.popleft().ack()
+            self.in_flight -= 1
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self.stopping.set)
+        await asyncio.to_thread(self._consume, loop)
+        logger.info("Async worker stopped")
+
+
+if __name__ == "__main__":
+    asyncio.run(AsyncGeminiWorker().run())
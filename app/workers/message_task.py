@@ -1,30 +1,152 @@
-# from app.integrations.gemini import GeminiAPI
-from typing import Dict, List
+from typing import Dict
+import random
+import time
 from sqlalchemy.orm import Session
 
 
+from celery.signals import worker_process_init, worker_process_shutdown
+
+from app.config import Config
+from app.core.pubsub import publish_message_sync
 from app.db.session import SessionLocal
-from app.integrations.gemini import GeminiChatClient
+from app.integrations.gemini import DEFAULT_MODEL_NAME, GeminiError, get_gemini_client
+from app.models.message import Message
 from app.services.message_service import create_gemini_message
+from app.services.prompt_service import build_prompt_sync
 from app.workers.queue import Celery_app
+from app.workers import scheduler
 from app.core.logger import logger
 
-@Celery_app.task(name="workers.message_task.process_message_response")
-def process_gemini_response(chatroom_id: str,chat_history: List[Dict[str, List[str]]], user_message: str):   
+@worker_process_init.connect
+def init_gemini_client(**kwargs):
+    """
+    Build the Gemini client once per worker process, after the fork, so every
+    task reuses its model and open API connection.
+    """
+    get_gemini_client.cache_clear()
+    get_gemini_client()
+    logger.info("Gemini client initialized for worker process")
+
+
+@worker_process_shutdown.connect
+def close_gemini_client(**kwargs):
+    get_gemini_client().close()
+
+
+def save_gemini_response(chatroom_id: str, response: str):
     """
-    Process the response from Gemini API and save it as a message in the chatroom. 
+    Store a Gemini reply in its chatroom; shared by the Celery task and the asyncio worker.
     """
- 
     db = SessionLocal()
     try:
-  
-        client = GeminiChatClient()
-        logger.info(f"Processing Gemini response for chatroom {chatroom_id}")
-
-        prompt="You are an intelligent and helpful AI assistant. Answer user questions clearly, accurately, and concisely. Provide additional context or suggestions when helpful."
-        response=client.get_response(chat_history, user_message, prompt)
         create_gemini_message(db, chatroom_id, response)
     finally:
         db.close()
-    
-    
\ No newline at end of file
+
+
+def load_prompt(chatroom_id: str, message_id: int):
+    """
+    Loads the user message and the prompt context for it, or None if the message is gone.
+    """
+    db = SessionLocal()
+    try:
+        message = db.get(Message, message_id)
+        if message is None:
+            return None
+        model_prompt, chat_history = build_prompt_sync(db, chatroom_id, message_id, message.content)
+        return message.content, model_prompt, chat_history
+    finally:
+        db.close()
+
+
+def generate_reply(chatroom_id: str, message_id: int, model_name: str = DEFAULT_MODEL_NAME):
+    """
+    Asks Gemini to answer user message ``message_id`` and stores the reply.
+    Only ids travel through the broker; the question, summary and history are
+    loaded here, mostly from the Redis history cache. Raises GeminiError.
+    """
+    prompt = load_prompt(chatroom_id, message_id)
+    if prompt is None:
+        logger.warning(f"Message {message_id} in chatroom {chatroom_id} no longer exists; skipping")
+        return
+    user_message, model_prompt, chat_history = prompt
+
+    client = get_gemini_client(model_name)
+    logger.info(f"Processing Gemini response for chatroom {chatroom_id}")
+
+    response=client.get_response(chat_history, user_message, model_prompt)
+    save_gemini_response(chatroom_id, response)
+
+
+def retry_delay(retries: int, error: GeminiError) -> float:
+    """
+    Seconds before retry number ``retries + 1``: full-jitter exponential
+    backoff, on top of any wait the error asks for (an open circuit breaker).
+    """
+    ceiling = min(Config.GEMINI_RETRY_BASE_SECONDS * 2 ** retries, Config.GEMINI_RETRY_MAX_SECONDS)
+    return (error.retry_after or 0) + random.uniform(0, ceiling)
+
+
+def give_up(chatroom_id: str, message_id: int, error: GeminiError):
+    """
+    No reply is stored for a failed prompt; clients on the chatroom's WebSocket
+    are told it failed so they can offer to resend.
+    """
+    logger.error(f"Giving up on Gemini reply to message {message_id} in chatroom {chatroom_id}: {error}")
+    publish_message_sync(chatroom_id, {
+        "error": "Error getting response from Gemini. Please try again.",
+        "chatroom_id": chatroom_id,
+        "message_id": message_id,
+    })
+
+
+def retry_or_give_up(job: Dict, retries: int, error: GeminiError):
+    """
+    Queues a delayed retry of ``job`` that has already been retried ``retries``
+    times, if the error is transient and retries are left.
+    """
+    if error.retryable and retries < Config.GEMINI_MAX_RETRIES:
+        countdown = retry_delay(retries, error)
+        logger.warning(f"Retrying Gemini reply to message {job['message_id']} in {countdown:.1f}s: {error}")
+        process_gemini_response.apply_async(kwargs=job, countdown=countdown, retries=retries + 1)
+    else:
+        give_up(job["chatroom_id"], job["message_id"], error)
+
+
+@Celery_app.task(name="workers.message_task.process_message_response", bind=True,
+                 max_retries=Config.GEMINI_MAX_RETRIES)
+def process_gemini_response(self, chatroom_id: str, message_id: int, model_name: str = DEFAULT_MODEL_NAME):
+    """
+    Process the response from Gemini API and save it as a message in the chatroom.
+    Transient failures are retried through Celery with backoff; permanent ones
+    and exhausted retries store nothing.
+    """
+    try:
+        generate_reply(chatroom_id, message_id, model_name)
+    except GeminiError as e:
+        if e.retryable and self.request.retries < self.max_retries:
+            countdown = retry_delay(self.request.retries, e)
+            logger.warning(f"Retrying Gemini reply to message {message_id} in {countdown:.1f}s: {e}")
+            raise self.retry(exc=e, countdown=countdown)
+        give_up(chatroom_id, message_id, e)
+
+
+@Celery_app.task(name="workers.message_task.run_next_gemini_job")
+def run_next_gemini_job():
+    """
+    Runs whichever queued Gemini job the fair scheduler picks next; one of
+    these is enqueued per job submitted through scheduler.submit_job.
+    A failed job has had its turn, so its retries go straight to the broker
+    as process_gemini_response tasks.
+    """
+    entry = scheduler.next_job()
+    if entry is None:
+        logger.info("No Gemini job waiting")
+        return
+    started_at = time.time()
+    try:
+        generate_reply(**entry["job"])
+    except GeminiError as e:
+        retry_or_give_up(entry["job"], 0, e)
+    finally:
+        scheduler.record_completion(entry["lane"], entry["submitted_at"], started_at)
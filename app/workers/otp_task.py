@@ -1,14 +1,196 @@
-import random
-import time
+# Batched OTP delivery.
+#
+# Codes to send wait in Redis: a list of mobile numbers in arrival order and
+# a hash of the code to send to each. A number already waiting only has its
+# code replaced, and a code that was already delivered is not queued again,
+# so client or task retries do not turn into extra SMS. flush_otp_batch
+# drains the outbox OTP_BATCH_SIZE numbers per provider call; one is started
+# whenever a batch fills up, and otherwise OTP_FLUSH_INTERVAL_SECONDS after
+# the first code of a quiet period. A batch the provider rejects goes back in
+# the outbox and the flush is retried with backoff until it gets through.
+#
+# Without Redis the outbox is unavailable; codes then go through the broker
+# as send_otp_task, or straight to the provider, one at a time.
 
+import asyncio
+from typing import Dict
+
+from app.config import Config
+from app.core import caching
+from app.core.logger import logger
+from app.integrations.sms import get_sms_provider
 from app.workers.queue import Celery_app
 
+OUTBOX_NUMBERS_KEY = "otp_outbox:numbers"
+OUTBOX_CODES_KEY = "otp_outbox:codes"
+FLUSH_SCHEDULED_KEY = "otp_outbox:flush_scheduled"
+
+OTP_MESSAGE = "Your verification code is {code}. It expires in {minutes} minutes."
+
+MAX_RETRY_DELAY_SECONDS = 60
+
+# KEYS: numbers, codes, sent marker. ARGV: number, code, overwrite (1/0).
+# Returns the outbox length, or -1 if this code was already delivered.
+ENQUEUE_SCRIPT = """
+if redis.call('GET', KEYS[3]) == ARGV[2] then
+    return -1
+end
+local added
+if ARGV[3] == '1' then
+    added = redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+else
+    added = redis.call('HSETNX', KEYS[2], ARGV[1], ARGV[2])
+end
+if added == 1 then
+    redis.call('RPUSH', KEYS[1], ARGV[1])
+end
+return redis.call('LLEN', KEYS[1])
+"""
+
+# KEYS: numbers, codes. ARGV: batch size. Returns number, code, number, code...
+POP_SCRIPT = """
+local numbers = redis.call('LRANGE', KEYS[1], 0, tonumber(ARGV[1]) - 1)
+redis.call('LTRIM', KEYS[1], #numbers, -1)
+local batch = {}
+for _, number in ipairs(numbers) do
+    local code = redis.call('HGET', KEYS[2], number)
+    if code then
+        redis.call('HDEL', KEYS[2], number)
+        batch[#batch + 1] = number
+        batch[#batch + 1] = code
+    end
+end
+return batch
+"""
+
+
+def _sent_key(mobile_number: str) -> str:
+    return f"otp_sent:{mobile_number}"
+
+
+def _enqueue_args(mobile_number: str, otp_code: str, overwrite: bool = True) -> list:
+    return [
+        ENQUEUE_SCRIPT, 3, OUTBOX_NUMBERS_KEY, OUTBOX_CODES_KEY, _sent_key(mobile_number),
+        mobile_number, otp_code, 1 if overwrite else 0,
+    ]
+
+
+def _schedule_flush(depth: int) -> None:
+    if depth < 0:
+        return
+    if depth % Config.OTP_BATCH_SIZE == 0:
+        flush_otp_batch.delay()
+    elif caching.sync_redis.set(FLUSH_SCHEDULED_KEY, 1, nx=True, ex=max(int(Config.OTP_FLUSH_INTERVAL_SECONDS), 1)):
+        flush_otp_batch.apply_async(countdown=Config.OTP_FLUSH_INTERVAL_SECONDS)
+
+
+async def _schedule_flush_async(depth: int) -> None:
+    if depth < 0:
+        return
+    if depth % Config.OTP_BATCH_SIZE == 0:
+        flush_otp_batch.delay()
+    elif await caching.redis.set(FLUSH_SCHEDULED_KEY, 1, nx=True, ex=max(int(Config.OTP_FLUSH_INTERVAL_SECONDS), 1)):
+        flush_otp_batch.apply_async(countdown=Config.OTP_FLUSH_INTERVAL_SECONDS)
+
+
+def _otp_message(otp_code: str) -> str:
+    return OTP_MESSAGE.format(code=otp_code, minutes=max(Config.OTP_TTL_SECONDS // 60, 1))
+
+
+def send_otp_now(mobile_number: str, otp_code: str) -> None:
+    """Sends one code with its own provider call, bypassing the outbox."""
+    get_sms_provider().send_bulk({mobile_number: _otp_message(otp_code)})
+
+
+def queue_otp(mobile_number: str, otp_code: str) -> None:
+    """Adds a code to the outbox and makes sure a flush will pick it up."""
+    depth = caching.sync_redis.eval(*_enqueue_args(mobile_number, otp_code))
+    if depth < 0:
+        logger.info(f"OTP for {mobile_number} already delivered; not sending again")
+    _schedule_flush(depth)
+
+
+async def queue_otp_async(mobile_number: str, otp_code: str) -> None:
+    """
+    Same as queue_otp, for the event loop. When the outbox is unavailable the
+    code is handed to send_otp_task, or sent from here if the broker is down too.
+    """
+    try:
+        depth = await caching.redis.eval(*_enqueue_args(mobile_number, otp_code))
+        if depth < 0:
+            logger.info(f"OTP for {mobile_number} already delivered; not sending again")
+        await _schedule_flush_async(depth)
+        return
+    except Exception as e:
+        logger.error(f"OTP outbox unavailable, sending OTP for {mobile_number} on its own: {e}")
+    try:
+        send_otp_task.delay(mobile_number, otp_code)
+    except Exception as e:
+        logger.error(f"Broker unavailable, sending OTP for {mobile_number} directly: {e}")
+        await asyncio.to_thread(send_otp_now, mobile_number, otp_code)
+
+
+def _pop_batch() -> Dict[str, str]:
+    flat = caching.sync_redis.eval(POP_SCRIPT, 2, OUTBOX_NUMBERS_KEY, OUTBOX_CODES_KEY, Config.OTP_BATCH_SIZE)
+    return dict(zip(flat[::2], flat[1::2]))
+
+
+def _requeue(batch: Dict[str, str]) -> None:
+    # A newer code queued for the same number meanwhile takes precedence
+    with caching.sync_redis.pipeline(transaction=False) as pipe:
+        for mobile_number, otp_code in batch.items():
+            pipe.eval(*_enqueue_args(mobile_number, otp_code, overwrite=False))
+        pipe.execute()
+
+
+def _mark_sent(batch: Dict[str, str]) -> None:
+    with caching.sync_redis.pipeline(transaction=False) as pipe:
+        for mobile_number, otp_code in batch.items():
+            pipe.set(_sent_key(mobile_number), otp_code, ex=Config.OTP_TTL_SECONDS)
+        pipe.execute()
+
+
+@Celery_app.task(name="workers.otp_tasks.flush_otp_batch", bind=True, max_retries=None, ignore_result=True)
+def flush_otp_batch(self):
+    """
+    Sends every OTP waiting in the outbox, OTP_BATCH_SIZE numbers per
+    provider call. Several flushes may run at once; each batch is taken
+    atomically, so no code is sent twice. While the provider fails, the
+    flush keeps retrying, backing off up to MAX_RETRY_DELAY_SECONDS, so
+    requeued codes never wait for an unrelated OTP to schedule a flush.
+    """
+    caching.sync_redis.delete(FLUSH_SCHEDULED_KEY)
+    provider = get_sms_provider()
+    sent = 0
+    while True:
+        batch = _pop_batch()
+        if not batch:
+            break
+        try:
+            provider.send_bulk({
+                mobile_number: _otp_message(otp_code) for mobile_number, otp_code in batch.items()
+            })
+        except Exception as e:
+            _requeue(batch)
+            countdown = min(Config.OTP_FLUSH_INTERVAL_SECONDS * 2 ** self.request.retries, MAX_RETRY_DELAY_SECONDS)
+            logger.error(f"OTP provider rejected a batch of {len(batch)}; retrying in {countdown:.0f}s: {e}")
+            raise self.retry(exc=e, countdown=countdown)
+        _mark_sent(batch)
+        sent += len(batch)
+    if sent:
+        logger.info(f"Sent {sent} OTPs")
+    return sent
+
+
 @Celery_app.task(name="workers.otp_tasks.send_otp_task")
 def send_otp_task(mobile_number, otp_code):
     """
-    Mock OTP sending task.
+    Queues one OTP for batched delivery, or sends it on its own when the
+    outbox is unavailable. The API queues codes directly with
+    queue_otp_async and only falls back to this task.
     """
-    print(f"[OTP Task] Sending OTP {otp_code} to {mobile_number}")
-    # Simulate sending delay
-    time.sleep(1)
-    return f"OTP {otp_code} sent to {mobile_number}"
+    try:
+        queue_otp(mobile_number, otp_code)
+    except Exception as e:
+        logger.error(f"OTP outbox unavailable, sending OTP for {mobile_number} directly: {e}")
+        send_otp_now(mobile_number, otp_code)
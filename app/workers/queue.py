@@ -17,13 +17,24 @@ Celery_app.conf.update(
         "workers.otp_tasks.send_otp_task": {
             "queue": "otp_queue"
         },
+        "workers.otp_tasks.flush_otp_batch": {
+            "queue": "otp_queue"
+        },
         "workers.message_task.process_message_response": {
             "queue": "message_queue"
         },
+        "workers.message_task.run_next_gemini_job": {
+            "queue": "message_queue"
+        },
+        "workers.summary_task.summarize_chatroom": {
+            "queue": "summary_queue"
+        },
         
     },
     task_serializer="json",
     result_serializer="json",
     accept_content=["json"],
+    # Optional compression of task payloads, e.g. "gzip"; workers decompress whatever they receive
+    task_compression=Config.CELERY_TASK_COMPRESSION,
 )
 
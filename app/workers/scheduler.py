@@ -0,0 +1,190 @@
+# Fair scheduling of Gemini jobs across subscription tiers and users.
+#
+# Jobs wait in Redis rather than in the broker: each tier has a lane holding a
+# list of jobs per user and a rotation of the users that have jobs waiting.
+# The broker only carries interchangeable "run the next job" tasks, one per
+# submitted job, so which job runs is decided when a worker is free:
+#
+#   - lanes are picked by weighted round-robin (GEMINI_LANE_WEIGHTS), falling
+#     through to the other lanes when the picked one is empty;
+#   - within a lane, users are served round-robin, one job each.
+#
+# A user with many jobs therefore waits behind every other active user of the
+# lane instead of in front of them, and each lane keeps a guaranteed share of
+# the workers however busy the others are.
+
+import json
+import statistics
+import time
+from typing import Dict, Optional
+
+from app.config import Config
+from app.core import caching
+from app.core.logger import logger
+from app.models.subscription import SubscriptionTierEnum
+
+PREFIX = "gemini_jobs"
+RECENT_JOBS_KEY = f"{PREFIX}:recent"
+RECENT_JOBS_SIZE = 200
+
+# KEYS: lane users, user jobs, lane depth. ARGV: user id, job
+SUBMIT_SCRIPT = """
+redis.call('RPUSH', KEYS[2], ARGV[2])
+if redis.call('LLEN', KEYS[2]) == 1 then
+    redis.call('RPUSH', KEYS[1], ARGV[1])
+end
+return redis.call('INCR', KEYS[3])
+"""
+
+# ARGV: key prefix, then lane/weight pairs. Returns {lane, job} or nil.
+# User job keys depend on the rotation, so they are built inside the script.
+DISPATCH_SCRIPT = """
+local prefix = ARGV[1]
+local lanes, weights, total = {}, {}, 0
+for i = 2, #ARGV, 2 do
+    lanes[#lanes + 1] = ARGV[i]
+    weights[#weights + 1] = tonumber(ARGV[i + 1])
+    total = total + tonumber(ARGV[i + 1])
+end
+
+local slot = redis.call('INCR', prefix .. ':tick') % total
+local start = 1
+for i, weight in ipairs(weights) do
+    if slot < weight then
+        start = i
+        break
+    end
+    slot = slot - weight
+end
+
+for offset = 0, #lanes - 1 do
+    local lane = lanes[(start + offset - 1) % #lanes + 1]
+    local users_key = prefix .. ':' .. lane .. ':users'
+    local user = redis.call('RPOPLPUSH', users_key, users_key)
+    if user then
+        local jobs_key = prefix .. ':' .. lane .. ':jobs:' .. user
+        local job = redis.call('LPOP', jobs_key)
+        if redis.call('LLEN', jobs_key) == 0 then
+            redis.call('LREM', users_key, 1, user)
+        end
+        if job then
+            redis.call('DECR', prefix .. ':' .. lane .. ':depth')
+            return {lane, job}
+        end
+    end
+end
+return nil
+"""
+
+
+def _lane_key(lane: str, name: str) -> str:
+    return f"{PREFIX}:{lane}:{name}"
+
+
+def _dispatch_args() -> list:
+    args = [PREFIX]
+    for lane in SubscriptionTierEnum:
+        args += [lane.value, max(Config.GEMINI_LANE_WEIGHTS.get(lane.value, 1), 1)]
+    return args
+
+
+async def submit_job(tier: str, user_id: str, job: dict) -> int:
+    """
+    Queues a job in the tier's lane under its user; returns the lane depth.
+    The caller then enqueues one run_next_gemini_job task for it.
+    """
+    return await caching.redis.eval(
+        SUBMIT_SCRIPT, 3,
+        _lane_key(tier, "users"), _lane_key(tier, f"jobs:{user_id}"), _lane_key(tier, "depth"),
+        user_id, json.dumps({"job": job, "submitted_at": time.time()}),
+    )
+
+
+def _decode(result) -> Optional[Dict]:
+    if not result:
+        return None
+    lane, entry = result
+    logger.info(f"Dispatching Gemini job from the {lane} lane")
+    return {**json.loads(entry), "lane": lane}
+
+
+def next_job() -> Optional[Dict]:
+    """
+    Takes the next job to run as {"job", "submitted_at", "lane"}, or None
+    when every lane is empty.
+    """
+    return _decode(caching.sync_redis.eval(DISPATCH_SCRIPT, 0, *_dispatch_args()))
+
+
+async def next_job_async() -> Optional[Dict]:
+    """Same as next_job, for the event loop."""
+    return _decode(await caching.redis.eval(DISPATCH_SCRIPT, 0, *_dispatch_args()))
+
+
+def _completion(lane: str, submitted_at: float, started_at: float) -> str:
+    now = time.time()
+    return json.dumps({"lane": lane, "done_at": now, "wait": started_at - submitted_at, "service": now - started_at})
+
+
+def record_completion(lane: str, submitted_at: float, started_at: float) -> None:
+    """
+    Keeps the lane, queue wait and run time of the last RECENT_JOBS_SIZE
+    jobs for admission control.
+    """
+    try:
+        with caching.sync_redis.pipeline(transaction=False) as pipe:
+            pipe.lpush(RECENT_JOBS_KEY, _completion(lane, submitted_at, started_at))
+            pipe.ltrim(RECENT_JOBS_KEY, 0, RECENT_JOBS_SIZE - 1)
+            pipe.execute()
+    except Exception as e:
+        logger.error(f"Error recording Gemini job completion: {e}")
+
+
+async def record_completion_async(lane: str, submitted_at: float, started_at: float) -> None:
+    """Same as record_completion, for the event loop."""
+    try:
+        async with caching.redis.pipeline(transaction=False) as pipe:
+            pipe.lpush(RECENT_JOBS_KEY, _completion(lane, submitted_at, started_at))
+            pipe.ltrim(RECENT_JOBS_KEY, 0, RECENT_JOBS_SIZE - 1)
+            await pipe.execute()
+    except Exception as e:
+        logger.error(f"Error recording Gemini job completion: {e}")
+
+
+def _job_stats(entries: list, now: float) -> Dict:
+    if not entries:
+        return {"samples": 0, "wait_p50": 0.0, "wait_p95": 0.0, "service_p50": 0.0, "throughput": 0.0}
+
+    waits = sorted(entry["wait"] for entry in entries)
+    span = max(now - min(entry["done_at"] for entry in entries), 1.0)
+    return {
+        "samples": len(entries),
+        "wait_p50": statistics.median(waits),
+        "wait_p95": waits[int(len(waits) * 0.95) - 1] if len(waits) >= 20 else waits[-1],
+        "service_p50": statistics.median(entry["service"] for entry in entries),
+        "throughput": len(entries) / span,  # Jobs finished per second
+    }
+
+
+async def recent_job_stats() -> Dict:
+    """
+    Queue wait, run time and completion rate over the recent jobs, for all
+    jobs under "all" and for each lane under its tier. Only jobs finished
+    within GEMINI_ADMISSION_WINDOW_SECONDS count, so a queue that has
+    stopped moving shows no throughput rather than an old rate.
+    """
+    entries = [json.loads(entry) for entry in await caching.redis.lrange(RECENT_JOBS_KEY, 0, -1)]
+    now = time.time()
+    recent = [entry for entry in entries if now - entry["done_at"] <= Config.GEMINI_ADMISSION_WINDOW_SECONDS]
+    stats = {"all": _job_stats(recent, now)}
+    for lane in SubscriptionTierEnum:
+        stats[lane.value] = _job_stats([entry for entry in recent if entry.get("lane") == lane.value], now)
+    return stats
+
+
+async def lane_depths() -> Dict[str, int]:
+    """Jobs waiting in each lane."""
+    depths = {}
+    for lane in SubscriptionTierEnum:
+        depths[lane.value] = max(int(await caching.redis.get(_lane_key(lane.value, "depth")) or 0), 0)
+    return depths
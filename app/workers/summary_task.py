@@ -0,0 +1,30 @@
+from redis.exceptions import LockNotOwnedError
+
+from app.db.session import SessionLocal
+from app.core import caching
+from app.integrations.gemini import get_gemini_client
+from app.services.summary_service import fold_old_messages
+from app.workers.queue import Celery_app
+from app.core.logger import logger
+
+@Celery_app.task(name="workers.summary_task.summarize_chatroom")
+def summarize_chatroom(chatroom_id: str, keep_from_id: int):
+    """
+    Fold chatroom messages older than ``keep_from_id``, the oldest message
+    prompts still send verbatim, into its rolling summary.
+    """
+    # One summarizer per chatroom at a time; a concurrent run would fold the same messages twice
+    lock = caching.sync_redis.lock(f"summary_lock:{chatroom_id}", timeout=300, blocking=False)
+    if not lock.acquire():
+        logger.info(f"Summary already running for chatroom {chatroom_id}")
+        return
+
+    db = SessionLocal()
+    try:
+        fold_old_messages(db, chatroom_id, get_gemini_client(), keep_from_id)
+    finally:
+        db.close()
+        try:
+            lock.release()
+        except LockNotOwnedError:
+            logger.error(f"Summary lock for chatroom {chatroom_id} expired before the run finished")
@@ -0,0 +1,123 @@
+"""
+Request latency under concurrent load: sync Session vs AsyncSession.
+
+Both endpoints are ``async def`` handlers running one query that takes
+``--query-delay`` seconds on the server, which stands in for a slow Postgres
+round trip. ``/sync`` uses a blocking ``Session`` (the old ``SessionLocal``
+path) and ``/async`` uses an ``AsyncSession`` (the ``get_db`` path).
+
+Usage:
+    python -m benchmarks.async_db_latency
+    python -m benchmarks.async_db_latency --sqlite   # offline, no Postgres needed
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.base import async_database_url, database_url
+
+
+def _register_sqlite_sleep(sync_engine):
+    """SQLite has no pg_sleep, so provide one backed by time.sleep."""
+    @event.listens_for(sync_engine, "connect")
+    def _connect(dbapi_connection, _):
+        dbapi_connection.create_function("pg_sleep", 1, time.sleep)
+
+
+def build_app(sync_url: str, async_url: str, pool_size: int, sqlite: bool) -> FastAPI:
+    engine = create_engine(sync_url, pool_size=pool_size, max_overflow=0)
+    async_engine = create_async_engine(async_url, pool_size=pool_size, max_overflow=0)
+    if sqlite:
+        _register_sqlite_sleep(engine)
+        _register_sqlite_sleep(async_engine.sync_engine)
+
+    SessionLocal = sessionmaker(bind=engine)
+    AsyncSessionLocal = async_sessionmaker(bind=async_engine)
+
+    async def get_async_db():
+        async with AsyncSessionLocal() as db:
+            yield db
+
+    app = FastAPI()
+
+    @app.get("/sync")
+    async def sync_route(delay: float):
+        db = SessionLocal()
+        try:
+            db.execute(text("SELECT pg_sleep(:d)"), {"d": delay})
+        finally:
+            db.close()
+        return {"ok": True}
+
+    @app.get("/async")
+    async def async_route(delay: float, db: AsyncSession = Depends(get_async_db)):
+        await db.execute(text("SELECT pg_sleep(:d)"), {"d": delay})
+        return {"ok": True}
+
+    return app
+
+
+async def run_load(app: FastAPI, path: str, requests: int, rate: float, delay: float):
+    """
+    Open-loop load: request ``i`` is due at ``i / rate`` seconds and its latency
+    is measured from that moment, so time spent queued behind a blocked event
+    loop counts against the request.
+    """
+    latencies = []
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def one(due: float):
+            await asyncio.sleep(max(0.0, due - time.perf_counter()))
+            response = await client.get(path, params={"delay": delay})
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - due)
+
+        # Warm up the pool before measuring
+        await asyncio.gather(*(client.get(path, params={"delay": 0}) for _ in range(10)))
+        started = time.perf_counter()
+        await asyncio.gather(*(one(started + i / rate) for i in range(requests)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "throughput_rps": requests / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--rate", type=float, default=200, help="Offered load in requests per second")
+    parser.add_argument("--pool-size", type=int, default=20)
+    parser.add_argument("--query-delay", type=float, default=0.02, help="Seconds each query spends in the database")
+    parser.add_argument("--sqlite", action="store_true", help="Use a temporary SQLite database instead of Postgres")
+    args = parser.parse_args()
+
+    if args.sqlite:
+        path = os.path.join(tempfile.mkdtemp(), "bench.db")
+        sync_url, async_url = f"sqlite:///{path}", f"sqlite+aiosqlite:///{path}"
+    else:
+        sync_url, async_url = database_url, async_database_url
+
+    app = build_app(sync_url, async_url, args.pool_size, args.sqlite)
+    for label, route in (("before (sync Session)", "/sync"), ("after (AsyncSession)", "/async")):
+        stats = asyncio.run(run_load(app, route, args.requests, args.rate, args.query_delay))
+        print(
+            f"{label:<24} p50={stats['p50_ms']:8.1f} ms  p99={stats['p99_ms']:8.1f} ms  "
+            f"throughput={stats['throughput_rps']:7.1f} req/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Broker memory and enqueue latency of process_gemini_response tasks:
+the old payload (full chat history, question and summary in the task
+arguments) vs the new one (chatroom id and message id only), each with and
+without gzip task compression.
+
+By default tasks go to kombu's in-memory transport and the size reported is
+the serialized message exactly as the Redis transport would LPUSH it. With
+--broker pointing at a real Redis the queue's MEMORY USAGE is reported
+instead, and enqueue latency includes the network round trip.
+
+Usage:
+    python -m benchmarks.broker_payload
+    python -m benchmarks.broker_payload --broker redis://localhost:6379/15 --history 50
+"""
+import argparse
+import statistics
+import time
+
+from kombu.utils.json import dumps
+
+from app.integrations.token_estimator import token_estimator
+from app.workers.message_task import process_gemini_response
+from app.workers.queue import Celery_app
+
+QUEUE = "benchmark_payload_queue"
+
+QUESTION = "Can you compare the approaches we discussed and tell me which one fits a small team best? " * 3
+REPLY = (
+    "Here is a detailed comparison of the options, covering setup cost, running cost, operational "
+    "burden and how each one scales as the team grows. "
+) * 12
+
+
+def old_payload(history_size: int) -> dict:
+    chat_history = [
+        {"role": role, "parts": [text], "token_count": token_estimator.count(text)}
+        for index in range(history_size)
+        for role, text in ((("user", QUESTION), ("gemini", REPLY))[index % 2],)
+    ]
+    return {
+        "chatroom_id": "5b0b7f0e-1c1e-4d4e-9d0a-2f6c1b7f9a11",
+        "chat_history": chat_history,
+        "user_message": QUESTION,
+        "summary": REPLY,
+    }
+
+
+def new_payload() -> dict:
+    return {"chatroom_id": "5b0b7f0e-1c1e-4d4e-9d0a-2f6c1b7f9a11", "message_id": 123456}
+
+
+def enqueue(kwargs: dict, tasks: int, compression) -> list:
+    latencies = []
+    with Celery_app.producer_or_acquire() as producer:
+        for _ in range(tasks):
+            started = time.perf_counter()
+            Celery_app.send_task(
+                process_gemini_response.name, kwargs=kwargs, queue=QUEUE,
+                compression=compression, producer=producer,
+            )
+            latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def queued_bytes(connection) -> int:
+    channel = connection.default_channel
+    if connection.transport_cls == "memory":
+        return sum(len(dumps(message)) for message in list(channel.queues[QUEUE].queue))
+    return channel.client.memory_usage(QUEUE) or 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--broker", default="memory://")
+    parser.add_argument("--tasks", type=int, default=500)
+    parser.add_argument("--history", type=int, default=50, help="History messages in the old payload")
+    args = parser.parse_args()
+
+    Celery_app.conf.broker_url = args.broker
+    # Results are irrelevant here and the result backend may not be reachable
+    Celery_app.conf.result_backend = None
+    Celery_app.conf.task_ignore_result = True
+
+    cases = (
+        ("before (full history)", old_payload(args.history), None),
+        ("before + gzip", old_payload(args.history), "gzip"),
+        ("after (ids only)", new_payload(), None),
+        ("after + gzip", new_payload(), "gzip"),
+    )
+    with Celery_app.connection_for_write() as connection:
+        for label, kwargs, compression in cases:
+            connection.default_channel.queue_declare(QUEUE)
+            connection.default_channel.queue_purge(QUEUE)
+            latencies = enqueue(kwargs, args.tasks, compression)
+            size = queued_bytes(connection)
+            latencies.sort()
+            print(
+                f"{label:<22} per task={size / args.tasks / 1024:8.2f} KiB  "
+                f"queue={size / 1024 / 1024:7.2f} MiB  "
+                f"enqueue p50={statistics.median(latencies) * 1000:6.3f} ms  "
+                f"p99={latencies[int(len(latencies) * 0.99) - 1] * 1000:6.3f} ms"
+            )
+            connection.default_channel.queue_purge(QUEUE)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Per-task overhead of the Gemini client in a Celery worker: a new
+``GeminiChatClient`` per task (the old ``process_gemini_response``) vs the
+process-wide client from ``get_gemini_client``.
+
+The API is replaced by a local gRPC server that answers GenerateContent
+immediately, so the numbers are client construction, channel setup and one
+round trip over loopback; against the real API each new channel also pays
+DNS and a TLS handshake.
+
+Usage:
+    python -m benchmarks.gemini_task_overhead
+    python -m benchmarks.gemini_task_overhead --tasks 500
+"""
+import argparse
+import statistics
+import time
+from concurrent import futures
+
+import google.ai.generativelanguage as glm
+import grpc
+
+from app.config import Config
+from app.integrations import gemini
+from app.integrations.gemini import DEFAULT_SYSTEM_PROMPT, GeminiChatClient, get_gemini_client
+
+GENERATE_CONTENT = "/google.ai.generativelanguage.v1beta.GenerativeService/GenerateContent"
+
+
+def start_stub_server() -> tuple:
+    """gRPC server on a free loopback port that replies to every GenerateContent with a canned answer."""
+    reply = glm.GenerateContentResponse(candidates=[glm.Candidate(
+        content=glm.Content(role="model", parts=[glm.Part(text="ok")]),
+        finish_reason=glm.Candidate.FinishReason.STOP,
+        index=0,
+    )])
+    payload = glm.GenerateContentResponse.serialize(reply)
+
+    handler = grpc.method_handlers_generic_handler(
+        "google.ai.generativelanguage.v1beta.GenerativeService",
+        {"GenerateContent": grpc.unary_unary_rpc_method_handler(
+            lambda request, context: payload,
+            request_deserializer=None,
+            response_serializer=None,
+        )},
+    )
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+    server.add_generic_rpc_handlers((handler,))
+    port = server.add_insecure_port("127.0.0.1:0")
+    server.start()
+    return server, port
+
+
+def use_stub_transport(port: int) -> None:
+    """Point the client at the stub over plaintext instead of TLS to the real API."""
+    Config.GEMINI_BACKEND = "google"
+    Config.GEMINI_API_ENDPOINT = f"127.0.0.1:{port}"
+    Config.GOOGLE_API_KEY = Config.GOOGLE_API_KEY or "benchmark"
+    GrpcTransport = glm.GenerativeServiceClient.get_transport_class("grpc")
+
+    def create_channel(cls, host, credentials=None, options=None, **kwargs):
+        return grpc.insecure_channel(host, options=options)
+
+    GrpcTransport.create_channel = classmethod(create_channel)
+
+
+def run_tasks(tasks: int, reuse: bool) -> dict:
+    history = [{"role": "user", "parts": ["hello"]}, {"role": "gemini", "parts": ["hi, how can I help?"]}]
+    durations = []
+    started = time.perf_counter()
+    for _ in range(tasks):
+        task_started = time.perf_counter()
+        client = get_gemini_client() if reuse else GeminiChatClient()
+        client.get_response(history, "What is the capital of France?", DEFAULT_SYSTEM_PROMPT)
+        if not reuse:
+            client.close()
+        durations.append(time.perf_counter() - task_started)
+    elapsed = time.perf_counter() - started
+
+    durations.sort()
+    return {
+        "p50_ms": statistics.median(durations) * 1000,
+        "p99_ms": durations[int(len(durations) * 0.99) - 1] * 1000,
+        "throughput": tasks / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=300)
+    args = parser.parse_args()
+
+    Config.GEMINI_TOKEN_VERIFY = False
+    server, port = start_stub_server()
+    use_stub_transport(port)
+    try:
+        # The first task of each mode warms up imports and the reused client
+        gemini.get_gemini_client.cache_clear()
+        for label, reuse in (("before (client per task)", False), ("after (process client)", True)):
+            run_tasks(1, reuse)
+            stats = run_tasks(args.tasks, reuse)
+            print(
+                f"{label:<26} p50={stats['p50_ms']:7.2f} ms  p99={stats['p99_ms']:7.2f} ms  "
+                f"throughput={stats['throughput']:7.1f} tasks/s"
+            )
+    finally:
+        get_gemini_client().close()
+        server.stop(None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Authentication overhead per request: verify_token with and without the
+verified-token cache, and the whole authenticate() dependency with the user
+served from the in-process user cache, so no database or Redis is involved.
+
+Every call presents the same token, as a client does between logins.
+
+Usage:
+    python -m benchmarks.jwt_verify
+    python -m benchmarks.jwt_verify --requests 50000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from app.config import Config
+from app.core import caching, jwt
+from app.core.auth_utils import authenticate
+
+USER = {"id": "5b0b7f0e-1c1e-4d4e-9d0a-2f6c1b7f9a11", "mobile_number": "9999999999", "name": "bench", "is_active": True}
+
+
+def time_calls(fn, requests: int) -> list:
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+async def time_authenticate(authorization: str, requests: int) -> list:
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        await authenticate(authorization, db=None)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def report(label: str, latencies: list):
+    latencies.sort()
+    print(
+        f"{label:<34} p50={statistics.median(latencies) * 1e6:8.1f} us  "
+        f"p99={latencies[int(len(latencies) * 0.99) - 1] * 1e6:8.1f} us  "
+        f"mean={statistics.fmean(latencies) * 1e6:8.1f} us"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    token = jwt.create_access_token({"user_id": USER["id"]})
+    authorization = f"Bearer {token}"
+    caching._local_users[USER["id"]] = USER
+
+    for enabled in (False, True):
+        Config.JWT_CACHE_ENABLED = enabled
+        jwt.clear_token_cache()
+        label = "cache on" if enabled else "cache off"
+        report(f"verify_token ({label})", time_calls(lambda: jwt.verify_token(token), args.requests))
+        report(f"authenticate ({label})", asyncio.run(time_authenticate(authorization, args.requests)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+OTP delivery throughput during a login storm: one provider call per OTP (the
+old send_otp_task, one code per task) vs the batched outbox drained by
+flush_otp_batch, both with the same number of OTP workers.
+
+A share of the requests are retries for a number that already has a code
+waiting, as happens when clients resend; the outbox collapses those into
+one SMS. The provider is LocalSmsProvider with a fixed latency per call.
+
+Needs a Redis server; its OTP outbox keys are cleared first.
+
+Usage:
+    python -m benchmarks.otp_dispatch
+    python -m benchmarks.otp_dispatch --otps 5000 --workers 4 --batch 200 --latency 0.5
+"""
+import argparse
+import random
+import threading
+import time
+
+from redis import Redis
+
+from app.config import Config
+from app.core import caching
+from app.core.otp import generate_otp
+from app.integrations import sms
+from app.workers import otp_task
+from app.workers.queue import Celery_app
+
+
+def storm(otps: int, retry_share: float) -> list:
+    requests, numbers = [], []
+    for _ in range(otps):
+        if numbers and random.random() < retry_share:
+            requests.append((random.choice(numbers[-50:]), generate_otp()))
+        else:
+            numbers.append(f"+1555{len(numbers):07d}")
+            requests.append((numbers[-1], generate_otp()))
+    return requests
+
+
+def run_workers(workers: int, target) -> float:
+    started = time.perf_counter()
+    threads = [threading.Thread(target=target) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started
+
+
+def one_per_call(requests: list, workers: int, provider: sms.LocalSmsProvider) -> float:
+    pending = list(requests)
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                if not pending:
+                    return
+                mobile_number, otp_code = pending.pop(0)
+            provider.send_bulk({mobile_number: otp_task.OTP_MESSAGE.format(code=otp_code, minutes=5)})
+
+    return run_workers(workers, worker)
+
+
+def batched(requests: list, workers: int, provider: sms.LocalSmsProvider) -> float:
+    original = otp_task.get_sms_provider
+    otp_task.get_sms_provider = lambda: provider
+    try:
+        started = time.perf_counter()
+        for mobile_number, otp_code in requests:
+            otp_task.queue_otp(mobile_number, otp_code)
+        # The flush tasks queue_otp enqueued are stand-ins for these workers
+        return time.perf_counter() - started + run_workers(workers, otp_task.flush_otp_batch)
+    finally:
+        otp_task.get_sms_provider = original
+
+
+def report(label: str, seconds: float, otps: int, provider: sms.LocalSmsProvider):
+    print(
+        f"{label:<16} {seconds:7.2f} s  {otps / seconds:8.1f} OTP/s  "
+        f"provider calls={provider.calls:<6} SMS sent={provider.messages}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--redis", default=Config.REDIS_URL)
+    parser.add_argument("--otps", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=4, help="OTP worker processes")
+    parser.add_argument("--batch", type=int, default=Config.OTP_BATCH_SIZE)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per provider call")
+    parser.add_argument("--retries", type=float, default=0.1, help="Share of requests that resend to a waiting number")
+    args = parser.parse_args()
+
+    caching.sync_redis = Redis.from_url(args.redis, decode_responses=True)
+    caching.sync_redis.delete(otp_task.OUTBOX_NUMBERS_KEY, otp_task.OUTBOX_CODES_KEY, otp_task.FLUSH_SCHEDULED_KEY)
+    # Flush tasks go nowhere; the benchmark drains the outbox itself
+    Celery_app.conf.broker_url = "memory://"
+    Config.OTP_BATCH_SIZE = args.batch
+
+    requests = storm(args.otps, args.retries)
+    before = sms.LocalSmsProvider(args.latency)
+    report("one per call", one_per_call(requests, args.workers, before), args.otps, before)
+    after = sms.LocalSmsProvider(args.latency)
+    report(f"batches of {args.batch}", batched(requests, args.workers, after), args.otps, after)
+
+
+if __name__ == "__main__":
+    main()
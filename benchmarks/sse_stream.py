@@ -0,0 +1,83 @@
+"""
+Time-to-first-token and full-reply latency of POST /message/{chatroom_id}/stream.
+
+Start the API with the local fake model so nothing leaves the machine:
+
+    GEMINI_BACKEND=fake FAKE_GEMINI_CHUNK_DELAY=0.05 uvicorn app.main:app
+
+then point this script at it with a token for a Pro user (Basic users are
+capped at a few prompts a day) and one of their chatrooms:
+
+    python -m benchmarks.sse_stream --token <jwt> --chatroom <id> --streams 200 --concurrency 50
+
+Before streaming, the first text a client could see was the full reply,
+i.e. the "full reply" column plus its polling interval.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+async def one_stream(client: httpx.AsyncClient, chatroom_id: str, headers: dict):
+    started = time.perf_counter()
+    first_token = None
+    async with client.stream(
+        "POST", f"/message/{chatroom_id}/stream", json={"content": "hello"}, headers=headers
+    ) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line == "event: chunk" and first_token is None:
+                first_token = time.perf_counter() - started
+            elif line in ("event: done", "event: error"):
+                break
+    return first_token, time.perf_counter() - started
+
+
+def _summary(values: list) -> str:
+    values = sorted(values)
+    p99 = values[max(int(len(values) * 0.99) - 1, 0)]
+    return f"p50={statistics.median(values) * 1000:8.1f} ms  p99={p99 * 1000:8.1f} ms"
+
+
+async def run(args):
+    semaphore = asyncio.Semaphore(args.concurrency)
+    headers = {"Authorization": f"Bearer {args.token}"}
+    results, errors = [], 0
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=120) as client:
+        async def worker():
+            nonlocal errors
+            async with semaphore:
+                try:
+                    results.append(await one_stream(client, args.chatroom, headers))
+                except Exception:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.streams)))
+        elapsed = time.perf_counter() - started
+
+    first_tokens = [first for first, _ in results if first is not None]
+    totals = [total for _, total in results]
+    print(f"streams={len(results)} errors={errors} throughput={len(results) / elapsed:.1f} streams/s")
+    if first_tokens:
+        print(f"time to first token  {_summary(first_tokens)}")
+    if totals:
+        print(f"full reply           {_summary(totals)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--token", required=True)
+    parser.add_argument("--chatroom", required=True)
+    parser.add_argument("--streams", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
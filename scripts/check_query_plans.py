@@ -0,0 +1,132 @@
+"""
+Asserts that every hot service query is answered by an index scan.
+
+Each query below mirrors the statement issued by the service named next to
+it. On Postgres the plan is taken with ``enable_seqscan = off`` so the check
+holds on small development tables, where a sequential scan would otherwise
+win on cost. SQLite is supported for offline runs.
+
+Usage:
+    python -m scripts.check_query_plans
+    python -m scripts.check_query_plans --url sqlite:///local.db
+"""
+import argparse
+import json
+import sys
+from datetime import datetime
+
+from sqlalchemy import create_engine, select, tuple_
+from sqlalchemy.engine import Connection
+
+from app.db.base import database_url
+from app.models.chatroom import Chatroom
+from app.models.message import Message
+from app.models.otp import OTP
+from app.models.subscription import Subscription
+from app.models.user import User
+from app.services import message_service
+
+NOW = datetime(2026, 1, 1)
+
+# (service call, statement, indexes that may serve it)
+HOT_QUERIES = [
+    (
+        "message_service.get_messages (first page)",
+        select(Message).where(Message.chatroom_id == "room")
+        .order_by(Message.created_at.desc(), Message.id.desc()).limit(51),
+        {"ix_messages_chatroom_created_id"},
+    ),
+    (
+        "message_service.get_messages (before cursor)",
+        select(Message).where(Message.chatroom_id == "room", tuple_(Message.created_at, Message.id) < (NOW, 1))
+        .order_by(Message.created_at.desc(), Message.id.desc()).limit(51),
+        {"ix_messages_chatroom_created_id"},
+    ),
+    (
+        "message_service.get_chat_history",
+        message_service._recent_messages_query("room"),
+        {"ix_messages_chatroom_created_id"},
+    ),
+    (
+        "chatroom_service.get_chatrooms",
+        select(Chatroom).where(Chatroom.user_id == "user"),
+        {"ix_chatrooms_user_id"},
+    ),
+    (
+        "auth_service.verify_otp",
+        select(OTP).where(
+            OTP.user_id == "user",
+            OTP.otp_code == "1234",
+            OTP.purpose == "login",
+            OTP.expires_at >= NOW,
+            OTP.is_verified == False
+        ),
+        {"ix_otps_user_purpose_verified_expires"},
+    ),
+    (
+        "SubscriptionService.get_status",
+        select(Subscription).where(Subscription.user_id == "user"),
+        {"ix_subscriptions_user_id"},
+    ),
+    (
+        "auth_utils.get_current_user",
+        select(User).where(User.id == "user"),
+        {"users_pkey", "ix_users_id", "sqlite_autoindex_users_1"},
+    ),
+]
+
+
+def _postgres_indexes(connection: Connection, sql: str, params: dict) -> set:
+    def walk(node):
+        if "Index Name" in node:
+            yield node["Index Name"]
+        for child in node.get("Plans", []):
+            yield from walk(child)
+
+    plan = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}", params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return set(walk(plan[0]["Plan"]))
+
+
+def _sqlite_indexes(connection: Connection, sql: str, params: tuple) -> set:
+    indexes = set()
+    for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}", params):
+        detail = row[-1]
+        if " USING " in detail and " INDEX " in detail:
+            indexes.add(detail.split(" INDEX ", 1)[1].split(" ")[0])
+        elif " USING INTEGER PRIMARY KEY" in detail or " USING PRIMARY KEY" in detail:
+            indexes.add("PRIMARY KEY")
+    return indexes
+
+
+def check(url: str) -> bool:
+    engine = create_engine(url)
+    ok = True
+    with engine.connect() as connection:
+        dialect = connection.dialect
+        if dialect.name == "postgresql":
+            connection.exec_driver_sql("SET enable_seqscan = off")
+        for name, statement, expected in HOT_QUERIES:
+            compiled = statement.compile(dialect=dialect)
+            if dialect.name == "postgresql":
+                used = _postgres_indexes(connection, str(compiled), compiled.params)
+            else:
+                params = tuple(compiled.params[key] for key in compiled.positiontup)
+                used = _sqlite_indexes(connection, str(compiled), params)
+            passed = bool(used & expected)
+            ok = ok and passed
+            print(f"{'OK  ' if passed else 'FAIL'} {name}: uses {sorted(used) or 'no index'}")
+    engine.dispose()
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=database_url, help="Sync SQLAlchemy URL of a migrated database")
+    args = parser.parse_args()
+    sys.exit(0 if check(args.url) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Deletes used and expired rows from the otps table, in batches so a large
+backlog does not hold long locks.
+
+Rows were never removed, so the table only grew. Run this periodically while
+OTP_BACKEND=postgres or OTP_POSTGRES_FALLBACK is on. Once OTP_BACKEND=redis
+has been live for OTP_TTL_SECONDS, every row left is dead; one more run
+empties the table.
+
+Usage:
+    python -m scripts.purge_otps
+    python -m scripts.purge_otps --url sqlite:///local.db --batch 5000
+"""
+import argparse
+from datetime import datetime
+
+from sqlalchemy import create_engine, delete, or_, select
+
+from app.db.base import database_url
+from app.models.otp import OTP
+
+
+def purge(url: str, batch: int) -> int:
+    engine = create_engine(url)
+    dead = or_(OTP.is_verified == True, OTP.expires_at < datetime.utcnow())
+    removed = 0
+    with engine.connect() as connection:
+        while True:
+            ids = select(OTP.id).where(dead).limit(batch).scalar_subquery()
+            deleted = connection.execute(delete(OTP).where(OTP.id.in_(ids))).rowcount
+            connection.commit()
+            removed += deleted
+            if deleted < batch:
+                break
+    engine.dispose()
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=database_url, help="Sync SQLAlchemy URL")
+    parser.add_argument("--batch", type=int, default=1000, help="Rows deleted per transaction")
+    args = parser.parse_args()
+    print(f"Deleted {purge(args.url, args.batch)} used or expired OTPs")
+
+
+if __name__ == "__main__":
+    main()